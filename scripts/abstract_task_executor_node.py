@@ -44,6 +44,25 @@ def validate_types(file, config):
     validate_field(file, config, mandatory=True, key='planning_format', datatype=[dict])
     validate_field(file, config['planning_format'], mandatory=True, key='planning_type', datatype=[str])
     validate_field(file, config['planning_format'], mandatory=True, key='heterogeneous_map', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='route_journal', datatype=[dict])
+    validate_field(file, config['planning_format'], mandatory=False, key='planner_trace', datatype=[dict])
+    validate_field(file, config['planning_format'], mandatory=False, key='hierarchical_search', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='alternative_routes', datatype=[int])
+    validate_field(file, config['planning_format'], mandatory=False, key='route_prefetch', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='node_leasing', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='eta_arbitration', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='traversal_model', datatype=[dict])
+    validate_field(file, config['planning_format'], mandatory=False, key='congestion', datatype=[dict])
+    validate_field(file, config['planning_format'], mandatory=False, key='background_planning', datatype=[bool])
+    validate_field(file, config['planning_format'], mandatory=False, key='planning_deadline', datatype=[int, float])
+
+    # Coordinator Fields
+    validate_field(file, config, mandatory=False, key='coordinator_format', datatype=[dict])
+    if 'coordinator_format' in config:
+        validate_field(file, config['coordinator_format'], mandatory=False, key='tick_scheduler', datatype=[dict])
+        validate_field(file, config['coordinator_format'], mandatory=False, key='tick_metrics', datatype=[dict])
+        validate_field(file, config['coordinator_format'], mandatory=False, key='tick_watchdog', datatype=[dict])
+        validate_field(file, config['coordinator_format'], mandatory=False, key='input_recorder', datatype=[dict])
 
     # Module Initialisation
     for module in config['active_modules']:
@@ -107,9 +126,15 @@ if __name__ == '__main__':
     coordinator = rasberry_coordination.rasberry_coordinator.RasberryCoordinator(
         default_agents=config_data['agents'],
         planning_format=config_data['planning_format'],
-        special_nodes=config_data['special_nodes'])
+        special_nodes=config_data['special_nodes'],
+        coordinator_format=config_data['coordinator_format'] if 'coordinator_format' in config_data else dict())
 
     rospy.on_shutdown(coordinator.on_shutdown)
+
+    # Start recording inputs, with the configuration so they can be replayed without the config or setup files
+    coordinator.input_recorder.record_config({k: config_data[k] for k in
+                                              ['agents', 'planning_format', 'special_nodes', 'coordinator_format', 'active_modules']
+                                              if k in config_data})
     rospy.sleep(1)  # give a second to let everything settle
 
 
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+""" Benchmark the FragmentPlanner on synthetic polytunnel maps, without a live ROS system
+
+usage: rosrun rasberry_coordination planner_benchmark.py --rows 10 20 --columns 20 50 --fleet 2 5 10
+"""
+
+import argparse, random, resource, gc
+from time import time as Now
+
+from rasberry_coordination.topomap_management.synthetic_map import generate_polytunnel_map, dump_map
+from rasberry_coordination.routing_management.offline_fleet import OfflineAgent, OfflineAgentManager
+from rasberry_coordination.routing_management.fragment_planner import FragmentPlanner, FragmentPlanner_map_filter
+from rasberry_coordination.tick_metrics import percentile
+
+try: import tracemalloc
+except ImportError: tracemalloc = None
+
+
+def peak_memory_mb():
+    if tracemalloc and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def build_fleet(raw_map, node_list, fleet_size, rng):
+    """ Place each agent on a distinct node with a random distinct goal """
+    starts = rng.sample(node_list, fleet_size)
+    goals = rng.sample([n for n in node_list if n not in starts], fleet_size)
+    agents = [OfflineAgent('robot_%02i' % i, raw_map, s, g) for i, (s, g) in enumerate(zip(starts, goals))]
+    return OfflineAgentManager(agents)
+
+
+def reset_goals(manager, rng, node_list):
+    occupied = [a.location() for a in manager.agent_details.values()]
+    for a in manager.agent_details.values():
+        a.set_goal(rng.choice([n for n in node_list if n not in occupied]))
+
+
+def time_call(timings, phase, fnc, *args):
+    t0 = Now()
+    result = fnc(*args)
+    timings.setdefault(phase, []).append((Now() - t0) * 1000.0)
+    return result
+
+
+def run_case(rows, columns, headlands, fleet_size, repeats, rng, hierarchical=False, alternatives=0):
+    tmap = generate_polytunnel_map(rows=rows, columns=columns, headlands=headlands)
+    node_list = [n['node']['name'] for n in tmap['nodes']]
+    raw_map = dump_map(tmap)
+
+    if tracemalloc: tracemalloc.start()
+    manager = build_fleet(raw_map, node_list, fleet_size, rng)
+    planner = FragmentPlanner(manager, heterogeneous_map=False, hierarchical_search=hierarchical, alternative_routes=alternatives)
+
+    timings = {}
+    for i in range(repeats):
+        reset_goals(manager, rng, node_list)
+
+        # Full replan as called by the coordinator
+        time_call(timings, 'find_routes', planner.find_routes)
+
+        # Individual phases of the replan, mirroring FragmentPlanner.plan_routes
+        planner.agent_details = manager.get_agent_list_copy()
+        planner.load_occupied_nodes()
+        for a in manager.agent_details.values():
+            start, goal = a.location(accurate=False), a.goal()
+            route = None
+            if alternatives:
+                route = time_call(timings, 'alternatives', a.map_handler.route_alternatives.unblocked_route, start, goal, planner.occupied_nodes, alternatives)
+            if route:
+                pass
+            elif hierarchical:
+                route = time_call(timings, 'search', a.map_handler.row_abstraction.search_route, start, goal, planner.occupied_nodes)
+            else:
+                time_call(timings, 'filtering', FragmentPlanner_map_filter.generate_filtered_map, a, start, goal, planner.occupied_nodes)
+                route = time_call(timings, 'search', a.map_handler.filtered_route_search.search_route, start, goal)
+            if route and route.source:
+                a.route, a.route_edges = route.source + [goal], route.edge_id
+            else:
+                a.route, a.route_edges = [a.location(accurate=True)], []
+            a.route_dists = a.map_handler.get_edge_distances()
+        time_call(timings, 'critical_points', planner.critical_points)
+        time_call(timings, 'split_critical_paths', planner.split_critical_paths)
+
+    memory = peak_memory_mb()
+    if tracemalloc: tracemalloc.stop()
+    del planner, manager; gc.collect()
+    return timings, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10])
+    parser.add_argument('--columns', type=int, nargs='+', default=[20])
+    parser.add_argument('--headlands', choices=['a', 'z', 'both'], default='both')
+    parser.add_argument('--fleet', type=int, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hierarchical', action='store_true', help='plan over the row abstraction of the map')
+    parser.add_argument('--alternatives', type=int, default=0, help='number of cached shortest routes to check before searching')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    header = "%6s %8s %6s  %-22s %9s %9s %9s %9s %9s" % ('rows', 'columns', 'fleet', 'phase', 'p50(ms)', 'p90(ms)', 'p99(ms)', 'max(ms)', 'mem(MB)')
+    print(header)
+    print('-' * len(header))
+    for rows in args.rows:
+        for columns in args.columns:
+            for fleet_size in args.fleet:
+                timings, memory = run_case(rows, columns, args.headlands, fleet_size, args.repeats, rng, args.hierarchical, args.alternatives)
+                for phase in ['find_routes', 'alternatives', 'filtering', 'search', 'critical_points', 'split_critical_paths']:
+                    t = timings.get(phase, [])
+                    print("%6i %8i %6i  %-22s %9.2f %9.2f %9.2f %9.2f %9.1f" % (rows, columns, fleet_size, phase,
+                          percentile(t, 50), percentile(t, 90), percentile(t, 99), max(t or [float('nan')]), memory))
+
+
+if __name__ == '__main__':
+    main()
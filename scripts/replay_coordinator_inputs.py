@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+""" Replay recorded coordinator inputs through a headless coordinator
+
+The coordinator is constructed from the recorded configuration, without any agents or farm systems
+connected. Each recorded message is passed straight to the callbacks subscribed to its topic, and an
+iteration of the coordinator loop is run wherever one started in the recording, so every iteration
+sees the same inputs as it did on the farm. At --rate 0 the inputs are replayed as fast as possible,
+stages which complete on a timeout then see less time pass than they did when recorded.
+
+Each recording session is written to its own files, give the files of one session oldest first. Every
+file begins with the configuration, so a replay may start from a rotated file, though agents added and
+maps received before that file are then missing.
+
+Requires a roscore, and the name abstract_task_coordinator to be free so private topics resolve as recorded.
+
+usage: rosrun rasberry_coordination replay_coordinator_inputs.py ~/.ros/coordinator_inputs.jsonl --rate 0 --profile ticks.prof
+"""
+
+import argparse
+import cProfile, pstats
+from time import time as Now, sleep
+
+import rospy
+
+from rasberry_coordination.input_recorder import load_inputs, deliver, SessionChanged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='files written by the input_recorder option of coordinator_format, oldest first')
+    parser.add_argument('--rate', type=float, default=1.0, help='replay speed relative to the recording, 0 for as fast as possible')
+    parser.add_argument('--profile', default=None, help='file to write a cProfile of the replayed iterations to')
+    args = parser.parse_args()
+
+    records = load_inputs(args.inputs)
+    record = next(records, None)
+    if not record or record['type'] != 'config':
+        print("%s does not begin with the coordinator configuration" % args.inputs[0])
+        return
+    config = record['config']
+
+    # Start ROS Node
+    rospy.init_node('abstract_task_coordinator', anonymous=False)
+
+    # Initialise modules for task manager
+    import rasberry_coordination.task_management.__init__ as task_init
+    task_init.set_properties(config['active_modules'])
+    task_init.load_custom_modules(list(set([t['name'] for t in config['active_modules']])))
+
+    # Create Coordinator, without recording the replayed inputs again
+    coordinator_format = dict(config.get('coordinator_format', None) or dict())
+    coordinator_format['input_recorder'] = {'enabled': False}
+    import rasberry_coordination.rasberry_coordinator
+    coordinator = rasberry_coordination.rasberry_coordinator.RasberryCoordinator(
+        default_agents=config['agents'],
+        planning_format=config['planning_format'],
+        special_nodes=config['special_nodes'],
+        coordinator_format=coordinator_format)
+
+    # Replay
+    profiler = cProfile.Profile() if args.profile else None
+    recorded_start, replay_start = record['t'], Now()
+    ticks, delivered, undelivered = 0, 0, {}
+    try:
+        for record in records:
+            if rospy.is_shutdown(): break
+            if args.rate > 0:
+                sleep(max(0.0, (record['t'] - recorded_start) / args.rate - (Now() - replay_start)))
+
+            if record['type'] == 'msg':
+                if deliver(record['topic'], record['msg']): delivered += 1
+                else: undelivered[record['topic']] = undelivered.get(record['topic'], 0) + 1
+
+            elif record['type'] == 'tick':
+                if profiler: profiler.enable()
+                coordinator.tick()
+                if profiler: profiler.disable()
+                ticks += 1
+    except SessionChanged as e:
+        print("Replay stopped: %s" % e)
+
+    print("Replayed %i iterations and %i messages in %.2fs" % (ticks, delivered, Now() - replay_start))
+    for topic, count in sorted(undelivered.items()):
+        print("   | %i messages on %s had no subscriber" % (count, topic))
+    print("\n".join(coordinator.tick_metrics.query()))
+    print("\n".join(coordinator.tick_watchdog.query()))
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    coordinator.tick_watchdog.close()
+    coordinator.routing_manager.route_journal.close()
+    coordinator.routing_manager.planner_trace.close()
+    if coordinator.routing_manager.planning_worker: coordinator.routing_manager.planning_worker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+""" Replay a planner trace through the FragmentPlanner, without a live ROS system
+
+Each recorded replan is rebuilt from its agent locations, goals, occupied nodes and priority
+overrides, planned again and compared against the recorded fragments. Use --hierarchical to
+compare the row abstraction search against the recorded (filtered map) plans.
+
+usage: rosrun rasberry_coordination replay_planner_trace.py ~/.ros/planner_trace.jsonl --repeats 5
+"""
+
+import argparse
+from time import time as Now
+
+from rasberry_coordination.routing_management.planner_trace import load_trace
+from rasberry_coordination.routing_management.offline_fleet import OfflineAgent, OfflineAgentManager
+from rasberry_coordination.routing_management.fragment_planner import FragmentPlanner
+from rasberry_coordination.tick_metrics import percentile
+
+
+def build_fleet(plan):
+    """ Recreate the agents of a recorded plan at their recorded locations """
+    agents = []
+    for agent_id, a in sorted(plan['agents'].items()):
+        agent = OfflineAgent(agent_id, plan['maps'][a['map']], a['current'] or a['closest'], a['goal'])
+        agent.location.closest_node = a['closest']
+        agent().route_required = a['route_required']
+        agents.append(agent)
+    return OfflineAgentManager(agents)
+
+
+def replay(plan, hierarchical=False, alternatives=0):
+    """ Plan a recorded replan again
+
+    :return: (duration in ms, [agent_ids whose fragments differ from the recording])
+    """
+    manager = build_fleet(plan)
+    planner = FragmentPlanner(manager, heterogeneous_map=False, hierarchical_search=hierarchical, alternative_routes=alternatives)
+
+    request = planner.snapshot()
+    request.occupied_nodes = plan['occupied']
+    request.priority_overrides = dict(plan['overrides'])
+    request.node_cost = plan.get('node_cost', {})
+
+    t0 = Now()
+    request = planner.plan_routes(request)
+    duration = (Now() - t0) * 1000.0
+
+    differ = []
+    for agent_id, recorded in plan['results'].items():
+        a = request.agents.get(agent_id)
+        fragments = [recorded['route'][s:e] for s, e in recorded['bounds']]
+        if not a or [list(f) for f in a.route_fragments] != fragments:
+            differ.append(agent_id)
+    return duration, sorted(differ)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='trace file written by the planner_trace option of planning_format')
+    parser.add_argument('--repeats', type=int, default=1, help='number of times to plan each replan')
+    parser.add_argument('--hierarchical', action='store_true', help='plan over the row abstraction of the map')
+    parser.add_argument('--alternatives', type=int, default=0, help='number of cached shortest routes to check before searching')
+    parser.add_argument('--verbose', action='store_true', help='list each replan whose fragments differ')
+    args = parser.parse_args()
+
+    plans = load_trace(args.trace)
+    print("Loaded %i replans from %s" % (len(plans), args.trace))
+
+    recorded, replayed, changed = [], [], 0
+    for i, plan in enumerate(plans):
+        recorded.append(plan['duration'] * 1000.0)
+        for r in range(args.repeats):
+            duration, differ = replay(plan, args.hierarchical, args.alternatives)
+            replayed.append(duration)
+        if differ:
+            changed += 1
+            if args.verbose: print("replan %i (t=%s): fragments differ for %s" % (i, plan['t'], differ))
+
+    header = "%-10s %9s %9s %9s %9s" % ('', 'p50(ms)', 'p90(ms)', 'p99(ms)', 'max(ms)')
+    print(header)
+    print('-' * len(header))
+    for name, t in [('recorded', recorded), ('replayed', replayed)]:
+        print("%-10s %9.2f %9.2f %9.2f %9.2f" % (name, percentile(t, 50), percentile(t, 90), percentile(t, 99), max(t or [float('nan')])))
+    print("%i of %i replans produced different fragments" % (changed, len(plans)))
+
+
+if __name__ == '__main__':
+    main()
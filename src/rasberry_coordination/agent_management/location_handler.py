@@ -5,6 +5,7 @@ from std_msgs.msg import Bool, String as Str, Empty as Emp
 import strands_executive_msgs.msg
 
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 from rasberry_coordination.msg import TasksDetails as TasksDetailsList, TaskDetails as SingleTaskDetails, Interruption
 
 import yaml
@@ -35,17 +36,22 @@ class LocationObj(object):
             return self.current_node or self.previous_node or self.closest_node
         return self.current_node or self.closest_node or self.previous_node
 
-    def current_node_cb(self, msg):
+    @queued('location', stamped=True)
+    def current_node_cb(self, msg, stamp=None):
         self.previous_node = self.current_node if self.current_node else self.previous_node
         self.current_node = None if msg.data == "none" else msg.data
+        if 'location_update' in self.agent.cb: self.agent.cb['location_update'](self.agent, stamp)
 
+    @queued('location', wake=False)
     def closest_node_cb(self, msg):
         self.closest_node = None if msg.data == "none" else msg.data
 
+    @queued('location', wake=False)
     def closest_edges_cb(self, msg):
         self.closest_edge = msg.edge_ids[msg.distances.index(min(msg.distances))]
         #print(self.closest_edge)
 
+    @queued('localisation')
     def disable_localisation(self, msg):
         if True: #self.agent.map.is_node(msg): msg in self.agent.empty_node_list!??!?!
             self.current_node_sub.unregister()
@@ -55,6 +61,7 @@ class LocationObj(object):
         else:
             logmsg(level='warn', agent=self.agent.agent_id, msg="canot fake localisation to node: %s" % str(msg))
 
+    @queued('localisation')
     def enable_localisation(self, msg):
         self.previous_node, self.current_node, self.closest_node = None, None, None
         self.current_node_sub = Subscriber(self.picker_id + "/current_node", Str, self.current_node_cb)
@@ -19,6 +19,7 @@ from diagnostic_msgs.msg import KeyValue
 from rasberry_coordination.msg import NewAgentConfig, MarkerDetails
 from rasberry_coordination.msg import Agent, AgentList, AgentRegistration, AgentState, AgentLocation, AgentHealth, AgentRendering
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 from rasberry_coordination.agent_management.location_handler import LocationObj as Location
 from rasberry_coordination.topomap_management.map_handler import MapObj as Map
 from rasberry_coordination.task_management.containers.Module import ModuleObj as Module
@@ -28,12 +29,28 @@ from rasberry_coordination.task_management.__init__ import Interfaces
 import rasberry_des.config_utils
 from topological_navigation.route_search2 import TopologicalRouteSearch2 as TopologicalRouteSearch
 
+class FleetSnapshot(dict):
+    """ Read-only {agent_id: AgentDetails} shared by each consumer of the fleet until an agent is added or removed """
+    def __init__(self, agent_details, version):
+        super(FleetSnapshot, self).__init__(agent_details)
+        self.version = version
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("FleetSnapshot is read-only, add or remove agents through the AgentManager")
+    __setitem__ = __delitem__ = pop = popitem = clear = update = setdefault = _read_only
+
+
 class AgentManager(object):
 
     """ Initialisation """
     def __init__(self, default_agents):
         self.agent_details = {}
         self.new_agent_buffer = dict()
+        self.cb = dict()
+
+        # Fleet snapshots, rebuilt only when the version changes (as agents are added or removed)
+        self.version = 0
+        self.snapshot = FleetSnapshot({}, self.version)
 
         # CallARobot Info Publisher
         self.car_info_robots_pub = Publisher('/car_client/info/robots', Str, queue_size=1, latch=True)  #TODO: this should not be included here
@@ -43,7 +60,6 @@ class AgentManager(object):
         self.s = Subscriber('/rasberry_coordination/dynamic_fleet/add_agent', NewAgentConfig, self.add_agent_cb)
 
         # Marker Management
-        self.cb = dict()
         self.set_marker_pub = Publisher('/rasberry_coordination/set_marker', MarkerDetails, queue_size=5)
         self.get_markers_sub = Subscriber('/rasberry_coordination/get_markers', Empty, self.get_markers_cb)
 
@@ -52,6 +68,7 @@ class AgentManager(object):
         self.fleet_last = None
 
     """ Dynamic Fleet """
+    @queued('add_agent', callbacks=lambda self: self.cb)
     def add_agent_cb(self, msg):
         def kvp_list(msg): return {kvp.key: yaml.safe_load(kvp.value) for kvp in msg}
         self.add_agent({'agent_id': msg.agent_id,
@@ -67,6 +84,7 @@ class AgentManager(object):
            agent_dict['agent_id'] not in self.new_agent_buffer:
             self.new_agent_buffer[agent_dict['agent_id']] = agent_dict
             self.car_info_robots_pub.publish(self.simplify())
+            if 'wake' in self.cb: self.cb['wake']('add_agent')
 
     def add_agent_from_buffer(self):
         buffer, self.new_agent_buffer = self.new_agent_buffer, dict()
@@ -74,13 +92,21 @@ class AgentManager(object):
             if agent_dict['agent_id'] not in self.agent_details.keys():
                 pprint.pprint(agent_dict)
                 self.agent_details[agent_dict['agent_id']] = AgentDetails(agent_dict, self.cb)
+                self.version += 1
                 logmsg(category="null")
 
+    def remove_agent(self, agent_id):
+        if self.agent_details.pop(agent_id, None):
+            self.version += 1
+
     """ Conveniences """
     def __getitem__(self, key):
         return self.agent_details[key] if key in self.agent_details else None
     def get_agent_list_copy(self):
-        return self.agent_details.copy()
+        """ Read-only {agent_id: AgentDetails}, the same object is returned until the fleet changes """
+        if self.snapshot.version != self.version:
+            self.snapshot = FleetSnapshot(self.agent_details, self.version)
+        return self.snapshot
 
     """ Fleet Monitoring """
     def fleet_monitoring(self):
@@ -244,6 +270,7 @@ class AgentDetails(object):
 
         if not index: self.task_buffer += [task]
         else: self.task_buffer.insert(index, [task])
+        if 'wake' in self.cb: self.cb['wake']('task', self.agent_id)
 
         if quiet:
             name = name if task.name == name else "%s/%s"%(name,task.name)
@@ -311,6 +338,12 @@ class AgentDetails(object):
         self()._end()
         self['stage_list'].pop(0)
         return None if self['stage_list'] else self['id']
+    def partners(self):
+        """ Agents whose stages may wait on this agent's: its contacts, the target of its stage, and the initiator and responder of its task """
+        ids = [c.agent_id for c in (self['contacts'] or dict()).values() if hasattr(c, 'agent_id')]
+        if self() and self().target_agent: ids += [self().target_agent.agent_id]
+        ids += [self['initiator_id'], self['responder_id']]
+        return [i for i in set(ids) if i and i != self.agent_id]
 
 
     """ Task Interruption """
@@ -320,6 +353,7 @@ class AgentDetails(object):
         else:
             logmsg(category="DTM", msg="Interrupt attached to %s of type: (%s,%s,%s)." % (self.agent_id, type, module, task_id))
         self.interruption = (type, module, task_id, scope)
+        if 'wake' in self.cb: self.cb['wake']('interrupt', self.agent_id)
 
 
     """ Logging """
@@ -383,10 +417,16 @@ class AgentDetails(object):
             m.agent = None
             m.interface.agent = None
 
-        coordinator.agent_manager.agent_details.pop(self.agent_id)  # Remove from agent manager
-        coordinator.route_finder.planner.agent_details.pop(self.agent_id)  # Remove from route planner
+        coordinator.agent_manager.remove_agent(self.agent_id)  # Remove from agent manager
+        if not coordinator.routing_manager.planning_worker:  # a background replan holds its own snapshot until the next
+            coordinator.routing_manager.planner.agent_details.pop(self.agent_id, None)  # Remove from route planner
+        coordinator.routing_manager.lease_manager.remove_agent(self.agent_id)  # Release its leased nodes
+        coordinator.routing_manager.congestion_model.remove_agent(self.agent_id)  # Stop crediting occupancy at its last node
+        coordinator.routing_manager.traversal_model.remove_agent(self.agent_id)  # Forget its last departure
+        coordinator.interaction_manager.special_node_index.remove_agent(self.agent_id)  # Release its special node claims
+        coordinator.interaction_manager.distance_oracles.pop(self.agent_id, None)  # Drop its cached route lengths
         self.map_handler.agent = None
-        coordinator.AllAgentsList.pop(self.agent_id)  # Remove from coordinator
+        coordinator.get_agents()  # Replace the coordinator's snapshot
 
         gc.collect()
 
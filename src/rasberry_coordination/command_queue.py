@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+import traceback
+from collections import deque, namedtuple
+from functools import wraps
+from time import time as Now
+
+from rasberry_coordination.coordinator_tools import logmsg
+
+
+Command = namedtuple('Command', ['name', 'fn', 'args', 'stamp'])
+
+
+class CommandQueue(object):
+    def __init__(self, wake=None):
+        """ Commands pushed by ROS callbacks, run in order by the coordinator loop at the start of each iteration
+
+        Callbacks only append to the queue, so all coordinator state is written by the loop thread alone.
+        deque.append and deque.popleft are atomic, so neither side takes a lock. Commands pushed from the
+        loop thread itself (eg. a queued callback calling another) run immediately.
+
+        :param wake: function(reason) called after each push, to start the next iteration without waiting
+        """
+        self.queue = deque()
+        self.wake = wake
+        self.thread = None  # thread which drains the queue
+
+    def push(self, name, fn, args=(), wake=True, stamp=None):
+        """ Queue fn(*args) for the loop, waking it unless the command can wait for the next iteration """
+        if threading.current_thread() is self.thread:
+            return fn(*args)
+        self.queue.append(Command(name, fn, args, Now() if stamp is None else stamp))
+        if wake and self.wake: self.wake(name)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def drain(self):
+        """ Run the commands queued before this call, commands pushed while draining wait for the next drain
+
+        :return: list of the time (in seconds) each command spent in the queue
+        """
+        self.thread = threading.current_thread()
+        latencies = []
+        for i in range(len(self.queue)):
+            command = self.queue.popleft()
+            latencies.append(Now() - command.stamp)
+            try:
+                command.fn(*command.args)
+            except Exception:
+                logmsg(level="error", category="CMD", msg="Command %s failed:" % command.name)
+                logmsg(level="error", category="CMD", msg=traceback.format_exc())
+        return latencies
+
+
+def queued(name, callbacks=lambda self: self.agent.cb, wake=True, stamped=False):
+    """ Decorate a ROS callback method so it is pushed to the CommandQueue rather than run on the rospy thread
+
+    :param name: command name, used as the wake reason
+    :param callbacks: function(self) returning the callback dictionary holding the queue's push as 'command',
+                      the callback runs immediately if there is no queue (eg. when used offline)
+    :param wake: False for frequent callbacks which should not start an iteration by themselves
+    :param stamped: pass the time the callback arrived (the command's stamp) to the method as a final argument,
+                    for callbacks which time events and would otherwise include the time spent in the queue
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, *args):
+            stamp = Now()
+            if stamped: args += (stamp,)
+            cb = callbacks(self)
+            if 'command' not in cb: return fn(self, *args)
+            cb['command'](name, fn, (self,) + args, wake, stamp)
+        return wrapper
+    return decorator
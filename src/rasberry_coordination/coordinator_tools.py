@@ -335,7 +335,15 @@ def logmsg(level="info", category="OTHER", id="empty", msg='', throttle=0, speec
 
     if id=="empty": id='';
     # if speech: os.system('spd-say "%s, %s" -r 10 -t female2 -w'%(id, basic_msg));
-    if speech: os.system('espeak "%s"'%basic_msg);
+    if speech: speak(basic_msg)
+
+
+def speak(text):
+    """ Speak the text without waiting for it to finish, so logging never blocks the coordinator loop """
+    try:
+        subprocess.Popen(['espeak', text])
+    except OSError:
+        pass  #espeak not installed
 
 
 
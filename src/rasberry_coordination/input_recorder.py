@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import os, json
+from base64 import b64encode, b64decode
+from io import BytesIO
+from time import time as Now
+
+import roslib.message
+from rospy.impl.registration import get_topic_manager
+
+from rasberry_coordination.routing_management.route_journal import RouteJournal
+
+
+class InputRecorder(RouteJournal):
+    def __init__(self, filepath='coordinator_inputs.jsonl', max_bytes=500*1024*1024, backups=3, enabled=False):
+        """ Record of every message received by the coordinator, to be replayed by scripts/replay_coordinator_inputs.py
+
+        Records share the RouteJournal writer and rotation, and are one of three types:
+            {"type": "config", "t", "session", "config"} the configuration the coordinator was started with
+            {"type": "msg", "t", "topic", "msg_type", "data"} a message received on a topic, serialised in base64
+            {"type": "tick", "t"} the start of an iteration of the coordinator loop
+
+        Each session starts a new file, rotating any previous recording away, and the config is written
+        at the start of every file, so a replay can start from any file of a session.
+
+        Recording starts once record_config is called. Messages are recorded by a callback attached to each
+        of the node's subscriptions, so every inbound topic is captured without changes to the callbacks
+        themselves. Subscriptions made later (eg. by a new agent) are attached at the start of the next
+        iteration, messages received before then are only captured if the topic is latched.
+        """
+        super(InputRecorder, self).__init__(filepath=filepath, max_bytes=max_bytes, backups=backups, enabled=enabled)
+        self.session = round(Now(), 3)  # identifies the files written by this coordinator
+        self.config = None  # config record, written at the start of each file
+        self.opened = False  # True once the first file of the session has been started
+        self.topics = set()  # subscriptions with the recording callback attached
+
+    def record_config(self, config):
+        """ Set the configuration needed to construct the coordinator again, and start recording """
+        if not self.enabled: return
+        self.config = {'type': 'config', 't': round(Now(), 3), 'session': self.session, 'config': config}
+        self.attach()
+
+    def tick(self):
+        """ Mark the start of an iteration, and attach to any subscriptions made since the last """
+        if not self.config: return
+        self.queue.put({'type': 'tick', 't': round(Now(), 3)})
+        self.attach()
+
+    def attach(self):
+        """ Attach the recording callback to each subscription not yet recorded """
+        manager = get_topic_manager()
+        for topic, msg_type in manager.get_subscriptions():
+            if topic in self.topics: continue
+            self.topics.add(topic)
+            manager.get_subscriber_impl(topic).add_callback(self.record_msg, topic)
+
+    def record_msg(self, msg, topic):
+        """ Queue a received message, called on the rospy thread which received it """
+        buff = BytesIO()
+        msg.serialize(buff)
+        self.queue.put({'type': 'msg', 't': round(Now(), 3), 'topic': topic, 'msg_type': msg._type,
+                        'data': b64encode(buff.getvalue()).decode('ascii')})
+
+    def _open(self):
+        """ Start each session in a new file, and begin every file with the config """
+        if not self.opened and os.path.exists(self.filepath) and os.path.getsize(self.filepath):
+            self._rotate()
+        self.opened = True
+        handle = super(InputRecorder, self)._open()
+        if not handle.tell(): self._write(handle, self.config)
+        return handle
+
+
+class SessionChanged(Exception):
+    """ Raised by load_inputs when the files given hold more than one recording session """
+
+
+def load_inputs(filepaths):
+    """ Read recorded inputs, in order, from each file
+
+    The config at the start of each file after the first is skipped, as it continues the same session.
+
+    :param filepaths: files written by InputRecorder, oldest first
+    :return: generator of records, with messages deserialised under 'msg'
+    :raises SessionChanged: if a file belongs to a different session than the first
+    """
+    classes, session = {}, None
+    for filepath in filepaths:
+        with open(filepath) as handle:
+            for line in handle:
+                if not line.strip(): continue
+                record = json.loads(line)
+                if record['type'] == 'config':
+                    if session is not None and record.get('session') != session:
+                        raise SessionChanged("%s was recorded by a different session, replay it separately" % filepath)
+                    if session is not None: continue
+                    session = record.get('session')
+                elif record['type'] == 'msg':
+                    if record['msg_type'] not in classes:
+                        classes[record['msg_type']] = roslib.message.get_message_class(record['msg_type'])
+                    record['msg'] = classes[record['msg_type']]().deserialize(b64decode(record['data']))
+                yield record
+
+
+def deliver(topic, msg):
+    """ Pass a message to each callback subscribed to the topic in this node, as rospy would on receiving it
+
+    :return: False if nothing in this node is subscribed to the topic
+    """
+    impl = get_topic_manager().get_subscriber_impl(topic)
+    if not impl: return False
+    for cb, cb_args in impl.callbacks:
+        if cb_args is not None: cb(msg, cb_args)
+        else: cb(msg)
+    return True
@@ -1,7 +1,10 @@
 import traceback
 from std_msgs.msg import String as Str
-from rospy import Publisher
+from rospy import Publisher, Service
+from rasberry_coordination.srv import StringList, StringListResponse
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.interaction_management.visit_order import VisitOrder, DistanceOracle
+from rasberry_coordination.interaction_management.special_node_index import SpecialNodeIndex
 
 class InteractionDetails(object):
     """TODO: move to encapsulators"""
@@ -20,7 +23,7 @@ class InteractionDetails(object):
         self.response = None
 
         ### info
-        self.info = info #['send_info', 'find_row_ends']
+        self.info = info #['send_info', 'find_row_ends', 'visit_order']
 
         self.silence = False
 
@@ -30,14 +33,44 @@ class InteractionManager(object):
         self.agent_manager = agent_manager
         self.routing_manager = routing_manager
         self.special_nodes = special_nodes
-        pass
+        self.special_node_index = SpecialNodeIndex(special_nodes)
+
+        # Optimised coverage of a set of rows or nodes
+        self.distance_oracles = {}
+        self.visit_order_srv = Service('/rasberry_coordination/visit_order', StringList, self.visit_order_cb)
+
+        # State shared by each interaction serviced in a batch
+        self.AllAgentsList = None
+        self.occupied = None
+        self.claimed_agents = set()
+        self.claimed_nodes = set()
 
     """ Services offerd by Coordinator to assist with tasks """
+    def offer_services(self, agents):
+        """ Service each pending interaction in one batch
+
+        The agent list and occupancy are loaded once for the batch, and route lengths are shared through
+        each agent's DistanceOracle. Interactions are serviced in order, and each result is claimed
+        before the next is serviced, so an agent or node found for one interaction is not offered to another.
+        """
+        self.AllAgentsList = self.agent_manager.get_agent_list_copy()
+        self.occupied = self.routing_manager.planner.load_occupied_nodes(ret=True)
+        self.claimed_agents = set()
+        self.claimed_nodes = set()
+        try:
+            for agent in agents:
+                self.offer_service(agent)
+        finally:
+            self.AllAgentsList = None
+            self.occupied = None
+
     def offer_service(self, agent):
+        if self.AllAgentsList is None:
+            return self.offer_services([agent])
+
         interaction = agent().interaction
         TP = interaction.type
 
-        self.AllAgentsList = self.agent_manager.agent_details.copy()
         if TP == 'search':
             try:
                 list = self.get_list(agent)
@@ -47,6 +80,9 @@ class InteractionManager(object):
                 print(traceback.format_exc())
                 item = None
             interaction.response = item
+            if hasattr(item, 'agent_id'): self.claimed_agents.add(item.agent_id)
+            elif item and agent.map_handler.is_node(item): self.claimed_nodes.add(item)
+            self.update_claims(agent)
         elif TP == 'info':
             resp = self.get_info(agent)
             interaction.response = resp
@@ -63,16 +99,14 @@ class InteractionManager(object):
             logmsg(category="action",     msg="   | Interaction result not found, will notify when result found")
             interaction.silence = True
 
-        self.AllAgentsList = None
-
     def get_list(self, agent):
         # Get list from given discription
         interaction = agent().interaction
         GR = interaction.grouping
 
         if GR == 'node_list':
-            # Use given list of nodes
-            L = interaction.list
+            # Use given list of nodes, filtering out ones found for another interaction in this batch
+            L = [n for n in interaction.list if n not in self.claimed_nodes]
 
         elif GR == 'agent_list':
             # Use given list of agents
@@ -83,11 +117,12 @@ class InteractionManager(object):
                 }
             if not L: return "empty"
 
+            # Filter list by filtering out ones found for another interaction in this batch
+            L = {k:v for k,v in L.items() if k not in self.claimed_agents}
+
         elif GR == 'node_descriptor':
-            # Generate list of nodes matching descriptor (special nodes listed in coordinator config)
-            descriptor = interaction.descriptor
-            occupied = self.get_occupied_nodes(agent)
-            L = [n['id'] for n in self.special_nodes if (descriptor in n['descriptors']) and (n['id'] not in occupied)]
+            # Generate list of nodes matching descriptor (special nodes listed in coordinator config), nearest first
+            L = [n for n in self.special_node_index.nearest_free(agent, interaction.descriptor) if n not in self.claimed_nodes]
 
         elif GR == 'agent_descriptor':
             # Generate list of agents based on some characteristics
@@ -110,6 +145,7 @@ class InteractionManager(object):
 
             # Filter list by filtering out ones not accepting new tasks
             L = {k:v for k,v in L.items() if (v.registration) and (v().accepting_new_tasks)}
+            L = {k:v for k,v in L.items() if k not in self.claimed_agents}
 
         elif GR == 'head_nodes':
             # Generate list of nodes based on format of name
@@ -143,6 +179,10 @@ class InteractionManager(object):
             i = self.get_dist(new_list)
             I = self.AllAgentsList[i] if i in self.AllAgentsList else None
 
+        elif ST == 'closest_node' and interaction.grouping == 'node_descriptor':
+            # Special nodes are already ordered by distance
+            I = list[0] if list else None
+
         elif ST == 'closest_node':
             # Find closet node in list
             new_list = {n: self.dist(agent, n, agent.location()) for n in list}
@@ -154,8 +194,8 @@ class InteractionManager(object):
                 from ideal_parking_spot import ideal_parking_spot as ips
                 parking_spots = ["r%s-ca"% spot for spot in ips(list, PLoc)]
                 occupied = self.get_occupied_nodes(agent)
-                new_list = [spot for spot in parking_spots if spot not in occupied]
-                I = new_list[0]
+                new_list = [spot for spot in parking_spots if spot not in occupied and spot not in self.claimed_nodes]
+                I = new_list[0] if new_list else None
             else:
                 I = None
 
@@ -183,13 +223,43 @@ class InteractionManager(object):
             row_id = interaction.descriptor
             return self.routing_manager.planner.get_row_ends(agent, row_id)
 
+        elif FO == 'visit_order':
+            return self.visit_order(agent, interaction.list)
+
 
     """ Interaction Tools """
+    def visit_order(self, agent, targets):
+        """ Order a list of row ids and/or node names for the agent to cover with the least travel
+
+        :return: list of nodes to visit, with both ends of each row in the direction to cover it
+        """
+        items = []
+        for t in targets:
+            if agent.map_handler.is_node(t):
+                items.append([t])
+            else:
+                ends = [n for n in self.routing_manager.planner.get_row_ends(agent, t) if agent.map_handler.is_node(n)]
+                if ends: items.append(ends)
+                else: logmsg(level="warn", category="action", id=agent.agent_id, msg="Visit order: %s is not a node or row" % t)
+
+        return VisitOrder(agent.location(), items, self.distance_oracle(agent)).solve()
+
+    def visit_order_cb(self, req):
+        """ Service to order rows/nodes for an agent, req.data: [agent_id, row_or_node, ...] """
+        resp = StringListResponse()
+        agent = self.agent_manager[req.data[0]] if req.data else None
+        if not agent or not agent.location() or not agent.map_handler.empty_map:
+            resp.success, resp.msg = False, "agent not found or not localised"
+            return resp
+        resp.msg = ", ".join(self.visit_order(agent, req.data[1:]))
+        resp.success = True
+        return resp
+
     def get_occupied_nodes(self, agent):
         AExcl = [a for _id, a in self.AllAgentsList.items() if (_id is not agent.agent_id)]
 
         # Get blocked nodes
-        occ = self.routing_manager.planner.load_occupied_nodes(ret=True)
+        occ = self.occupied if self.occupied is not None else self.routing_manager.planner.load_occupied_nodes(ret=True)
         occupied = sum([v for k,v in occ.items() if k is not agent.agent_id], [])
 
         # Include navigation targets
@@ -197,17 +267,38 @@ class InteractionManager(object):
         occupied += [a.goal() for a in AExcl if a.goal()]
         return occupied
 
+    def update_claims(self, agent):
+        """ Update the special nodes claimed by an agent, from its occupation, goal and interaction result
+
+        Called as each of these changes (location update, stage start and end, interaction response),
+        so node_descriptor lookups read the claims as they stand.
+        """
+        claimed = list(agent.modules['navigation'].interface.occupation()) if 'navigation' in agent.modules else []
+        if agent():
+            claimed += [agent.goal()]
+            if agent().interaction and agent().interaction.response and agent.map_handler.is_node(agent().interaction.response):
+                claimed += [agent().interaction.response]
+        self.special_node_index.claim(agent.agent_id, [n for n in claimed if n])
+
     def get_dist(self, dist_list):
         if dist_list:
             return min(dist_list, key=dist_list.get)
         return None
 
+    def distance_oracle(self, agent):
+        """ Route lengths in the agent's unfiltered map, cached until the agent's map changes """
+        oracle = self.distance_oracles.get(agent.agent_id)
+        if not oracle or oracle.raw_msg is not agent.map_handler.raw_msg:
+            oracle = self.distance_oracles[agent.agent_id] = DistanceOracle(agent)
+        return oracle
+
     def dist(self, agent, start, goal):
         # Return the total distance from the start point to each goal
         try:
             if not type(goal) == list:
                 goal = [goal]
-            return sum([agent.map_handler.get_route_length(agent, start, g) for g in goal])
+            oracle = self.distance_oracle(agent)
+            return sum([oracle(start, g) for g in goal])
         except:
             print("Try-Except in manager.py for Action_Management modules")
             print(traceback.format_exc())
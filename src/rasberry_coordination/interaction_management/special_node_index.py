@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import heapq
+
+
+class SpecialNodeIndex(object):
+    def __init__(self, special_nodes):
+        """ Lookup of the special nodes (listed in the coordinator config) by descriptor, nearest first
+
+        For each map and start node, the special nodes of each descriptor are ordered once by their
+        route length to the start node, this ordering is kept until the map changes. The agents
+        claiming each special node (by occupying it, or targeting it) are updated as differences,
+        so "nearest free wait_node" is a walk along a precomputed list rather than a route search
+        per candidate.
+
+        :param special_nodes: [{'id': node, 'descriptors': [descriptor, ...]}, ...]
+        """
+        self.descriptors = {}  # {descriptor: [node, ...]}
+        for n in special_nodes:
+            for d in n['descriptors']:
+                self.descriptors.setdefault(d, []).append(n['id'])
+        self.special = set([n['id'] for n in special_nodes])
+
+        self.claims = {}  # {agent_id: set(node)} special nodes claimed by each agent
+        self.claimants = {}  # {node: set(agent_id)}
+
+        self.maps = {}  # {topic: raw_msg} map each ordering was built for
+        self.orderings = {}  # {topic: {(start, descriptor): [node, ...]}}
+        self.reverse_adjacency = {}  # {topic: {node: [(previous_node, length), ...]}}
+
+    def claim(self, agent_id, nodes):
+        """ Replace the special nodes claimed by an agent, only the difference is applied """
+        new = self.special.intersection(nodes)
+        old = self.claims.get(agent_id, set())
+        for n in old - new:
+            self.claimants[n].discard(agent_id)
+        for n in new - old:
+            self.claimants.setdefault(n, set()).add(agent_id)
+        self.claims[agent_id] = new
+
+    def remove_agent(self, agent_id):
+        self.claim(agent_id, [])
+        self.claims.pop(agent_id, None)
+
+    def is_free(self, node, agent_id=None):
+        """ Is the node unclaimed by any agent other than agent_id """
+        return not (self.claimants.get(node, set()) - set([agent_id]))
+
+    def nearest(self, agent, descriptor, start=None):
+        """ Special nodes with the descriptor, ordered by route length from each node to start
+
+        :param agent: agent whose map is used
+        :param start: node the distances are measured to (defaults to the agent's location)
+        :return: list of nodes, unreachable nodes are last
+        """
+        start = start or agent.location()
+        topic, raw_msg = agent.map_handler.topic, agent.map_handler.raw_msg
+        if self.maps.get(topic) != raw_msg:
+            self.maps[topic] = raw_msg
+            self.orderings[topic] = {}
+            self.reverse_adjacency[topic] = self.build_reverse_adjacency(agent.map_handler.edge_index)
+
+        key = (start, descriptor)
+        if key not in self.orderings[topic]:
+            dist = self.distances_to(self.reverse_adjacency[topic], start)
+            nodes = self.descriptors.get(descriptor, [])
+            self.orderings[topic][key] = sorted(nodes, key=lambda n: dist.get(n, float('inf')))
+        return self.orderings[topic][key]
+
+    def nearest_free(self, agent, descriptor, start=None):
+        """ Unclaimed special nodes with the descriptor, nearest first """
+        return [n for n in self.nearest(agent, descriptor, start) if self.is_free(n, agent.agent_id)]
+
+    @staticmethod
+    def build_reverse_adjacency(edge_index):
+        adjacency = {}
+        for from_node, to_node, length in edge_index.edges.values():
+            adjacency.setdefault(to_node, []).append((from_node, length))
+        return adjacency
+
+    @staticmethod
+    def distances_to(reverse_adjacency, goal):
+        """ Route length from every node to the goal (Dijkstra over the reversed edges) """
+        dist, queue = {goal: 0.0}, [(0.0, goal)]
+        while queue:
+            d, node = heapq.heappop(queue)
+            if d > dist[node]: continue
+            for previous, length in reverse_adjacency.get(node, []):
+                if d + length < dist.get(previous, float('inf')):
+                    dist[previous] = d + length
+                    heapq.heappush(queue, (d + length, previous))
+        return dist
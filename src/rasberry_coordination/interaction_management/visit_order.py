@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+
+class DistanceOracle(object):
+    """ Cached route lengths between nodes in an agent's unfiltered map """
+    def __init__(self, agent):
+        self.agent = agent
+        self.raw_msg = agent.map_handler.raw_msg
+        self.cache = {}
+
+    def __call__(self, start, goal):
+        if (start, goal) not in self.cache:
+            self.cache[(start, goal)] = self.agent.map_handler.get_route_length(self.agent, start, goal)
+        return self.cache[(start, goal)]
+
+
+class VisitOrder(object):
+    def __init__(self, start, items, distance, max_passes=20):
+        """ Order a set of rows or nodes to minimise the travel between them (open travelling salesman)
+
+        Each item is a list of one node, or the two ends of a row. A row is covered by entering at
+        one end and leaving by the other, so the end chosen to enter each row is optimised too. A
+        nearest neighbour tour is improved with 2-opt (reversing a run of items, which also flips
+        the direction each row is covered) and Or-opt (moving a run of up to three items).
+
+        :param start: node the agent begins from
+        :param items: list of [node] or [row_end, row_end]
+        :param distance: distance(from_node, to_node) oracle
+        :param max_passes: limit on improvement passes over the tour
+        """
+        self.start = start
+        self.items = items
+        self.distance = distance
+        self.max_passes = max_passes
+
+    def entry(self, step): return self.items[step[0]][-1 if step[1] else 0]
+    def exit(self, step): return self.items[step[0]][0 if step[1] else -1]
+
+    def cost(self, tour):
+        """ Travel between items, the length of each row is the same whichever way it is covered """
+        total, position = 0.0, self.start
+        for step in tour:
+            total += self.distance(position, self.entry(step))
+            position = self.exit(step)
+        return total
+
+    def nearest_neighbour(self):
+        tour, position, remaining = [], self.start, list(range(len(self.items)))
+        while remaining:
+            options = [(i, flip) for i in remaining for flip in ([False, True] if len(self.items[i]) > 1 else [False])]
+            step = min(options, key=lambda s: (self.distance(position, self.entry(s)), s))
+            tour.append(step)
+            remaining.remove(step[0])
+            position = self.exit(step)
+        return tour
+
+    def two_opt(self, tour):
+        """ Best tour found by reversing any run of items """
+        best, best_cost = tour, self.cost(tour)
+        for i in range(len(tour)):
+            for j in range(i, len(tour)):
+                candidate = tour[:i] + [(k, not flip) for k, flip in reversed(tour[i:j + 1])] + tour[j + 1:]
+                cost = self.cost(candidate)
+                if cost < best_cost - 1e-9:
+                    best, best_cost = candidate, cost
+        return best
+
+    def or_opt(self, tour):
+        """ Best tour found by moving a run of up to three items, in either direction """
+        best, best_cost = tour, self.cost(tour)
+        for length in [1, 2, 3]:
+            for i in range(len(tour) - length + 1):
+                segment, rest = tour[i:i + length], tour[:i] + tour[i + length:]
+                reversed_segment = [(k, not flip) for k, flip in reversed(segment)]
+                for j in range(len(rest) + 1):
+                    for seg in [segment, reversed_segment]:
+                        candidate = rest[:j] + seg + rest[j:]
+                        cost = self.cost(candidate)
+                        if cost < best_cost - 1e-9:
+                            best, best_cost = candidate, cost
+        return best
+
+    def solve(self):
+        """ :return: list of nodes to visit in order, giving both ends of each row in the direction of travel """
+        tour = self.nearest_neighbour()
+        for _ in range(self.max_passes):
+            improved = self.or_opt(self.two_opt(tour))
+            if improved == tour: break
+            tour = improved
+        return sum([self.items[k][::-1] if flip else list(self.items[k]) for k, flip in tour], [])
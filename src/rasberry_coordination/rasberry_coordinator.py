@@ -14,24 +14,31 @@ import yaml
 from time import time as Now, sleep
 from pprint import pprint
 import rospy, rospkg
-from rospy import Subscriber, Publisher
+from rospy import Subscriber, Publisher, Service
 from std_msgs.msg import String as Str, Empty
+from diagnostic_msgs.msg import DiagnosticArray
 
 from rasberry_coordination.interaction_management.manager import InteractionManager
 from rasberry_coordination.task_management.manager import TaskManager
 from rasberry_coordination.agent_management.manager import AgentManager
 from rasberry_coordination.routing_management.manager import RoutingManager
+from rasberry_coordination.tick_scheduler import TickScheduler
+from rasberry_coordination.tick_metrics import TickMetrics
+from rasberry_coordination.tick_watchdog import TickWatchdog
+from rasberry_coordination.command_queue import CommandQueue
+from rasberry_coordination.input_recorder import InputRecorder
 
 from rasberry_coordination.coordinator_tools import logmsg, logmsgbreak, Rasberry_Logger
 from rasberry_coordination.agent_management.location_handler import LocationObj as Location
 from rasberry_coordination.task_management.containers.Module import ModuleObj as Module
 from rasberry_coordination.task_management.containers.Task import TaskObj as Task
 from rasberry_coordination.msg import MarkerDetails
+from rasberry_coordination.srv import String as StringSrv, StringResponse
 
 
 class RasberryCoordinator(object):
     """RasberryCoordinator class definition"""
-    def __init__(self, default_agents, planning_format, special_nodes):
+    def __init__(self, default_agents, planning_format, special_nodes, coordinator_format=None):
 
         # Construct Sub-System Managers
         self.agent_manager = AgentManager(default_agents)
@@ -43,6 +50,57 @@ class RasberryCoordinator(object):
         # Inisialise cross-references
         self.agent_manager.cb['force_replan'] = self.routing_manager.force_replan
         self.agent_manager.cb['trigger_replan'] = self.routing_manager.trigger_replan
+        self.agent_manager.cb['location_update'] = self.location_update
+
+        # Wake the coordinator loop on activity, rather than polling at a fixed rate
+        coordinator_format = coordinator_format or dict()
+        scheduler_format = coordinator_format['tick_scheduler'] if 'tick_scheduler' in coordinator_format else dict()
+        self.tick_scheduler = TickScheduler(**scheduler_format)
+        self.agent_manager.cb['wake'] = self.tick_scheduler.wake
+
+        # Run ROS callbacks on the coordinator loop, so coordinator state has a single writer
+        self.command_queue = CommandQueue(wake=self.tick_scheduler.wake)
+        self.agent_manager.cb['command'] = self.command_queue.push
+
+        # Measure each phase of the coordinator loop
+        metrics_format = coordinator_format['tick_metrics'] if 'tick_metrics' in coordinator_format else dict()
+        self.tick_metrics = TickMetrics(**metrics_format)
+        self.tick_metrics_pub = Publisher('/rasberry_coordination/tick_metrics', DiagnosticArray, queue_size=1)
+        self.tick_metrics_srv = Service('/rasberry_coordination/tick_metrics/query', StringSrv, self.query_tick_metrics)
+
+        # Report iterations which overrun their deadline, and postpone deferrable work in late iterations
+        watchdog_format = coordinator_format['tick_watchdog'] if 'tick_watchdog' in coordinator_format else dict()
+        self.tick_watchdog = TickWatchdog(**watchdog_format)
+        self.tick_watchdog_srv = Service('/rasberry_coordination/tick_watchdog/query', StringSrv, self.query_tick_watchdog)
+
+        # Record every message received, so the inputs can be replayed off the farm
+        recorder_format = coordinator_format['input_recorder'] if 'input_recorder' in coordinator_format else dict()
+        self.input_recorder = InputRecorder(**recorder_format)
+
+        # State carried between iterations of the coordinator loop
+        self.task_logger = Rasberry_Logger(enable_task_logging=True)
+        self.dtm_update_time = Now()  #time of the last DTM update
+        self.dtm_update_required = False  #new stages since the last DTM update
+        self.completed_tasks = []  #completed tasks not yet sent to DTM
+
+    def location_update(self, agent, stamp=None):
+        self.routing_manager.location_update(agent, stamp)
+        self.interaction_manager.update_claims(agent)
+        self.tick_scheduler.wake('location', agent.agent_id)
+
+    def query_tick_metrics(self, req):
+        """ Service to inspect the loop timings, see TickMetrics.query for the request format """
+        resp = StringResponse()
+        resp.msg = "\n".join(self.tick_metrics.query(req.data))
+        resp.success = True
+        return resp
+
+    def query_tick_watchdog(self, req):
+        """ Service to inspect overrunning iterations, see TickWatchdog.query for the request format """
+        resp = StringResponse()
+        resp.msg = "\n".join(self.tick_watchdog.query(req.data))
+        resp.success = True
+        return resp
 
     def on_shutdown(self, ):
         """on shutdown cancel all goals
@@ -52,94 +110,175 @@ class RasberryCoordinator(object):
         logmsg(level='warn', msg='AgentManager shutting down, saving agent_list')
         dict_list = [a.agent_dict for a in self.agent_manager.agent_details.values()]
         with open('coordinator-loaded-agents-save-state.yaml', 'w') as file: yaml.dump(dict_list, file)
+
+        logmsg(level='warn', msg='RoutingManager shutting down, flushing route journal')
+        self.routing_manager.route_journal.close()
+        self.routing_manager.planner_trace.close()
+        if self.routing_manager.planning_worker: self.routing_manager.planning_worker.close()
+        self.tick_watchdog.close()
+
+        logmsg(level='warn', msg='Coordinator shutting down, flushing input recording')
+        self.input_recorder.close()
+
     def run(self):
+        """ Run iterations of the coordinator loop until shutdown, waiting between them until woken """
+        while not rospy.is_shutdown():
+            active = self.tick()
+            self.tick_scheduler.wait(active)
+
+    def tick(self):
+        """ Run a single iteration of the coordinator loop
+
+        :return: True if the iteration progressed any agent, so the next should follow without backing off
+        """
 
         # Remappings to for commonly used functions
         get_agents      = self.get_agents
-        offer_service   = self.interaction_manager.offer_service
+        offer_services  = self.interaction_manager.offer_services
+        update_claims   = self.interaction_manager.update_claims
         find_routes     = self.routing_manager.find_routes
         publish_routes  = self.routing_manager.publish_routes
         trigger_routing = self.routing_manager.trigger_routing
+        extend_leases   = self.routing_manager.extend_leases
+        collect_routes  = self.routing_manager.collect_routes
+        prefetch_routes = self.routing_manager.prefetch_routes
+        apply_prefetch  = self.routing_manager.apply_prefetched_routes
         interrupt_task  = self.task_manager.interrupt_task
+        take_dirty      = self.tick_scheduler.take_dirty
+        sweep_due       = self.tick_scheduler.sweep_due
+        wake            = self.tick_scheduler.wake
+        record          = self.tick_metrics.record
+        at              = self.tick_watchdog.at
+        defer           = self.tick_watchdog.defer
+        drain_commands  = self.command_queue.drain
 
         # Remappings for commonly referenced objects
         AM  = self.agent_manager
 
         # Systems for unintrusive standardised logging
-        RL  = Rasberry_Logger(enable_task_logging=True)
-        def l(idx): return; RL.log_minimal(idx, self.AllAgentsList)
+        def l(idx): return; self.task_logger.log_minimal(idx, self.AllAgentsList)
         def logbreak(section, condition):
             if any(condition):
                 logmsg(category="null")
                 content = ('\033[01;04;92m', section, '\033[38;5;231m\033[0m')
                 logmsg(level="info", category="SECT", id="SECTION", msg="%s%s%s"%content)
 
+        # Timing of each iteration, for metrics and the watchdog
+        def begin_tick(): self.tick_metrics.begin(); self.tick_watchdog.begin()
+        def lap(phase, count=None): self.tick_metrics.lap(phase, count); self.tick_watchdog.lap(phase)
+        def end_tick(): self.tick_metrics.end(); self.tick_watchdog.end()
+
         # Timeout function for logging DTM updates
         DTM = self.task_manager.toc_interface
-        Ut = Now(); #time since last DTM update
-        def Update_DTM(A, DTM, Ut):
-            if any([a().new_stage for a in A]) or (Now() - Ut > 5):
+        def Update_DTM(Un, DTM, Ut):
+            if Un or (Now() - Ut > 5):
                 DTM.UpdateTaskList();
                 return Now();
             return Ut
 
-        # Begin task progression
-        l(-1)
-        while not rospy.is_shutdown():
+        # Run Commands queued by callbacks since the last iteration
+        begin_tick()
+        self.input_recorder.tick()
+        C = drain_commands();                                                             """ Run Queued Commands """
+        [record('command_latency', c) for c in C]
+        lap('commands', len(C))
+
+        # Agents changed by callbacks since the last iteration
+        dirty = take_dirty()
+
+        # Add New Agents
+        new_agent_buffer = AM.new_agent_buffer
+        logbreak("NEW AGENTS", new_agent_buffer)
+        if new_agent_buffer: AM.add_agent_from_buffer();                                      """ Add New Agents """
+        active = [bool(new_agent_buffer)]
+        lap('new_agents', len(new_agent_buffer))
+
+        # Update local list of Agents (new might have been added)
+        A = get_agents()
 
-            # Add New Agents
-            new_agent_buffer = AM.new_agent_buffer
-            logbreak("NEW AGENTS", new_agent_buffer)
-            if new_agent_buffer: AM.add_agent_from_buffer();                                      """ Add New Agents """
+        # Interrupt Stage Execution
+        interrupts = [a.interruption for a in A]; a=None; del A
+        logbreak("INTERRUPTS", interrupts)
+        if any(interrupts): interrupt_task(AM.get_agent_list_copy());              """ Interrupt Stage Execution """
+        active += interrupts
+        if any(interrupts): dirty.update(AM.get_agent_list_copy().keys())
+        lap('interrupts', len([i for i in interrupts if i]))
 
-            # Update local list of Agents (new might have been added)
-            A = get_agents()
+        # Update local list of Agents (existing might have been removed)
+        A = get_agents()
 
-            # Interrupt Stage Execution
-            interrupts = [a.interruption for a in A]; a=None; del A
-            logbreak("INTERRUPTS", interrupts)
-            if any(interrupts): interrupt_task(AM.get_agent_list_copy());              """ Interrupt Stage Execution """
+        # Start Buffered Task
+        logbreak("START TASK", [not a['stage_list'] for a in A])
+        S = [a.start_next_task() for a in A if not a['stage_list']]; l(0);               """ Start Buffered Task """
+        active += [a().new_stage for a in A]
+        lap('start_task', len(S))
 
-            # Update local list of Agents (existing might have been removed)
-            A = get_agents()
+        # Start Stage
+        logbreak("START STAGE", [a().new_stage for a in A])
+        dirty.update([a.agent_id for a in A if a().new_stage])
+        N = [a for a in A if a().new_stage]
+        S = [at(a).start_stage() for a in N];                                                        """ Start Stage """
+        [update_claims(a) for a in N]
+        lap('start_stage', len(S))
 
-            # Start Buffered Task
-            logbreak("START TASK", [not a['stage_list'] for a in A])
-            [a.start_next_task() for a in A if not a['stage_list']]; l(0);                   """ Start Buffered Task """
+        # Monitoring (postponed while the iteration is running late)
+        self.dtm_update_required = self.dtm_update_required or any([a().new_stage for a in A])
+        M = not defer('monitoring')
+        if M: self.dtm_update_time = Update_DTM(self.dtm_update_required, DTM, self.dtm_update_time)
+        if M: self.dtm_update_required = False
+        if M: AM.fleet_monitoring()
+        lap('monitoring', len(A) if M else 0)
 
-            # Start Stage
-            logbreak("START STAGE", [a().new_stage for a in A])
-            [a.start_stage() for a in A if a().new_stage];                                           """ Start Stage """
+        # Offer Action Services
+        servicees = [a for a in A if a().interaction_required]
+        if servicees: offer_services(servicees); l(2);                                        """ Offer Services """
+        active += [bool(servicees)]
+        if servicees: dirty.update([a.agent_id for a in A])
+        lap('services', len(servicees))
 
-            # Monitoring
-            Ut = Update_DTM(A, DTM, Ut);
-            AM.fleet_monitoring()
+        # Find Routes
+        apply_prefetch(A);                                                         """ Apply Prefetched Routes """
+        trigger = trigger_routing(A)
+        logbreak("ROUTE FIND", [trigger])
+        if trigger: find_routes();                                                               """ Find Routes """
+        else: extend_leases(A); prefetch_routes(A);                                             """ Extend Leases and Prefetch Routes """
+        collect_routes();                                                         """ Collect Background Routes """
+        lap('find_routes', len(A) if trigger else 0)
 
-            # Offer Action Services
-            servicees = [a for a in A if a().interaction_required]
-            if servicees: offer_service(servicees[0]); l(2);                                       """ Offer Service """
+        # Publish Routes
+        logbreak("ROUTE PUBLISH", [a().route_found for a in A])
+        active += [trigger] + [a().route_found for a in A]
+        P = [publish_routes(at(a), trigger) for a in A if a().route_found]; l(3);                 """ Publish Routes """
+        lap('publish_routes', len(P))
 
-            # Find Routes
-            trigger = trigger_routing(A)
-            logbreak("ROUTE FIND", [trigger])
-            if trigger: find_routes();                                                               """ Find Routes """
+        #Perform Stage-Completion Query (on changed agents, polled stages, or all agents once per sweep)
+        Q = A if sweep_due() else [a for a in A if a.agent_id in dirty or a().polled]
+        [at(a)()._query() for a in Q]; l(4);                                                               """ Query """
+        lap('query', len(Q))
 
-            # Publish Routes
-            logbreak("ROUTE PUBLISH", [a().route_found for a in A])
-            [publish_routes(a, trigger) for a in A if a().route_found]; l(3);                     """ Publish Routes """
+        # End Stage
+        logbreak("END", [a().stage_complete for a in Q])
+        F = [a for a in Q if a().stage_complete]
+        partners = set(sum([a.partners() for a in F], []))  # taken before the stage (and its target agent) is ended
+        E=[at(a).end_stage() for a in F];                                                          """ End Stage """
+        [update_claims(a) for a in F]
 
-            #Perform Stage-Completion Query
-            [a()._query() for a in A]; l(4);                                                               """ Query """
+        # Query the partners of each ended stage in the next iteration, rather than waiting for the sweep
+        [wake('handover', p) for p in partners]
 
-            # End Stage
-            logbreak("END", [a().stage_complete for a in A])
-            E=[a.end_stage() for a in A if a().stage_complete];                                        """ End Stage """
+        # Update DTM (postponed while the iteration is running late)
+        self.completed_tasks += [e for e in E if e]
+        if self.completed_tasks and not defer('dtm'): DTM.EndTask(self.completed_tasks); self.completed_tasks = [];   """ Update DTM w/ Completed """
+        active += [True for e in E] + [bool(self.completed_tasks)]
+        lap('end_stage', len(E))
 
-            # Update DTM
-            if any(E): DTM.EndTask(E);                                                   """ Update DTM w/ Completed """
+        # Publish Metrics
+        end_tick()
+        if self.tick_metrics.publish_due(): self.tick_metrics_pub.publish(self.tick_metrics.diagnostics())
 
-            # Publish Log and Wait
-            l(-2); rospy.sleep(0.2)
+        # Publish Log
+        l(-2)
+        return any(active)
 
 
     def get_agents(self):
@@ -52,12 +52,23 @@ class BasePlanner(object):
                     dist += agent.route_dists[i]
         return dist
 
+    def get_route_eta_to_node(self, agent_id, node_id):
+        """get the expected time for an agent to reach a node in its route, using the traversal model
+
+        Keyword arguments:
+            agent_id -- id of the agent to be checked
+            node_id -- node being checked
+        """
+        agent = self.agent_details[agent_id]
+        return self.traversal_model.route_eta(agent, agent.location.current_node or agent.location.closest_node, node_id)
+
     def shortest_route_to_node(self, agent_ids, node_id):
-        """from a list of robot_ids, find the robot with shortest route distance to a given node
+        """from a list of robot_ids, find the robot with shortest route distance (or eta if available) to a given node
         """
+        measure = self.get_route_eta_to_node if self.traversal_model else self.get_route_distance_to_node
         dists = {}
         for agent_id in agent_ids:
-            dists[agent_id] = self.get_route_distance_to_node(agent_id, node_id)
+            dists[agent_id] = measure(agent_id, node_id)
 
         return sorted(dists.items(), key=operator.itemgetter(1))[0][0]
 
@@ -111,6 +122,13 @@ class BasePlanner(object):
         self.occupied_nodes = None
         self.heterogeneous_map = heterogeneous_map
 
+        # Arbitrate critical points by expected arrival time instead of distance if a model is given
+        self.traversal_model = None
+
+        # Penalise entering busy nodes in search if a model is given
+        self.congestion_model = None
+        self.node_cost = {}
+
     @abstractmethod
     def find_routes(self):
         self.agent_details = {a.agent_id: a for a in self.agent_manager.agent_details.values() if a.location.has_presence}
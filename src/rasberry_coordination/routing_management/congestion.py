@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+from math import exp, log
+from time import time as Now
+
+
+class CongestionModel(object):
+    def __init__(self, penalty=0.0, half_life=600.0, min_cost=0.01):
+        """ Decaying histogram of how long each node has been occupied, used to penalise busy nodes in search
+
+        Occupancy is integrated exactly from each agent's node changes, with older occupancy decaying
+        exponentially. The occupancy of a node is the fraction of the recent past it has held an agent
+        (1.0 for a node always occupied by one agent), and entering the node costs penalty * occupancy.
+
+        :param penalty: cost (in metres) of entering a node which is always occupied, 0.0 disables the model
+        :param half_life: time (in seconds) for past occupancy to lose half its weight
+        :param min_cost: node costs below this are not reported
+        """
+        self.penalty = penalty
+        self.tau = half_life / log(2)
+        self.min_cost = min_cost
+        self.lock = threading.Lock()  # observations arrive from location callbacks
+        self.load = {}  # {node: (decayed seconds of occupancy, stamp)}
+        self.present = {}  # {agent_id: (node, stamp of arrival)}
+
+    def _decayed(self, node, now):
+        value, stamp = self.load.get(node, (0.0, now))
+        return value * exp(-(now - stamp) / self.tau)
+
+    def _credit(self, since, now):
+        """ Decayed occupancy of an agent present on the node from since until now """
+        return self.tau * (1.0 - exp(-(now - since) / self.tau))
+
+    def observe(self, agent_id, node, stamp=None):
+        """ Record the node an agent is now on (None if it has left the map) """
+        now = Now() if stamp is None else stamp
+        with self.lock:
+            previous = self.present.get(agent_id)
+            if previous and previous[0] == node: return
+            if previous:
+                self.load[previous[0]] = (self._decayed(previous[0], now) + self._credit(previous[1], now), now)
+            if node: self.present[agent_id] = (node, now)
+            else: self.present.pop(agent_id, None)
+
+    def remove_agent(self, agent_id, stamp=None):
+        """ Close out the occupancy of an agent which has been removed from the fleet """
+        self.observe(agent_id, None, stamp)
+
+    def occupancy(self, stamp=None):
+        """ {node: fraction of recent time the node has been occupied} including agents currently present """
+        now = Now() if stamp is None else stamp
+        with self.lock:
+            occ = {n: self._decayed(n, now) for n in self.load}
+            for node, since in self.present.values():
+                occ[node] = occ.get(node, 0.0) + self._credit(since, now)
+        return {n: v / self.tau for n, v in occ.items()}
+
+    def node_cost(self, stamp=None):
+        """ {node: cost of entering the node}, empty if the model is disabled """
+        if not self.penalty: return {}
+        costs = {n: self.penalty * o for n, o in self.occupancy(stamp).items()}
+        return {n: c for n, c in costs.items() if c >= self.min_cost}
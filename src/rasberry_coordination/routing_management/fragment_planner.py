@@ -8,20 +8,34 @@
 
 import threading, traceback
 from pprint import pprint
+from time import time as Now
 
 from rasberry_coordination.routing_management.base_planner import BasePlanner
+from rasberry_coordination.routing_management.wait_for_graph import WaitForGraph
+from rasberry_coordination.routing_management.planning_worker import AgentSnapshot, PlanningRequest
+from rasberry_coordination.routing_management.route_fragments import RouteFragments
 from rasberry_coordination.coordinator_tools import logmsg
 
 
 class FragmentPlanner(BasePlanner):
-    def __init__(self, all_agent_details_pointer, heterogeneous_map):
+    def __init__(self, all_agent_details_pointer, heterogeneous_map, hierarchical_search=False, alternative_routes=0):
         """ Copy parameters to properties
 
         Args:
             all_agent_details_pointer - pointer to coordinator.all_agents_list a dictionary of all agent_details objects
+            hierarchical_search - plan over the row abstraction of each map instead of a filtered copy of the map
+            alternative_routes - number of cached shortest routes to check for one clear of occupied nodes, before searching
         """
         super(FragmentPlanner, self).__init__(all_agent_details_pointer, heterogeneous_map)
         self.task_lock = threading.Lock()
+        self.hierarchical_search = hierarchical_search
+        self.alternative_routes = alternative_routes
+
+        # Arbitration of critical points
+        self.cpoint_owners = {}  # {node: agent_id} agent granted each critical point in the last replan
+        self.priority_overrides = {}  # {node: agent_id} arbitration enforced to resolve deadlocks
+        self.applied_overrides = {}  # priority_overrides of the last replan applied, read by the main loop
+        self.wait_for_graph = WaitForGraph()
 
     def critical_points(self, ):
         """find points where agent's path cross with those of active robots.
@@ -86,23 +100,30 @@ class FragmentPlanner(BasePlanner):
                 c_points[str(agent.route)].remove(goal)
 
         allowed_cpoints = []  #
-        res_routes = {}  #
+        res_routes = {}  # {agent_id: RouteFragments} unformatted partial routes
+        self.cpoint_owners = {}
+
+        """ drop priority overrides once the agent has passed the node """
+        self.priority_overrides = {n: a for n, a in self.priority_overrides.items()
+                                   if a in self.agent_details and n in self.agent_details[a].route}
 
         """ for each agent populate res_routes with partial routes"""
         for agent in self.agent_details.values():
             agent_id = agent.agent_id
             allowed_to_pass = False
-            collective_route = []
-            partial_route = []
+            fragment_starts = [0]  # index in the route of the first node of each partial route
 
             """ for each node in the route """
-            for node in agent.route:
+            for i, node in enumerate(agent.route):
 
                 """ if node is a critical point in the route """
                 if node in c_points[str(agent.route)]:
 
-                    """identify robot closest to the node"""
-                    nearest_agent = self.shortest_route_to_node(c_agents[node], node)
+                    """identify robot closest to the node, unless priority is enforced"""
+                    if self.priority_overrides.get(node) in c_agents[node]:
+                        nearest_agent = self.priority_overrides[node]
+                    else:
+                        nearest_agent = self.shortest_route_to_node(c_agents[node], node)
 
                     """
                     each critical vertice can be given to 1 robot thus we give it to the closest robot and
@@ -111,167 +132,229 @@ class FragmentPlanner(BasePlanner):
                     if (agent_id == nearest_agent and node not in allowed_cpoints):
                         """ if vertice is unassigned, and is best assigned to this robot, assign it so"""
                         """also enable the chosen robot to take the remaining nodes using allowed_to_pass"""
-                        partial_route.append(node)
                         allowed_cpoints.append(node)
+                        self.cpoint_owners[node] = agent_id
                         allowed_to_pass = True
 
-                    elif node not in allowed_cpoints and allowed_to_pass:
+                    elif node not in allowed_cpoints and allowed_to_pass and self.priority_overrides.get(node, agent_id) == agent_id:
                         """ if vertice is unassigned, robot has been given permission to take the rest """
-                        partial_route.append(node)
                         allowed_cpoints.append(node)
+                        self.cpoint_owners[node] = agent_id
 
-                    else:
+                    elif i > 0:
                         """ if robot is not the nearest or the robot has not been given permission to take the rest """
-                        """ if the robot has an existing route, save it to the collective and reset partial route """
-                        if partial_route:
-                            collective_route.append(partial_route)
-                        partial_route = [node]
+                        """ start a new partial route from this node """
+                        fragment_starts.append(i)
 
-                else:
-                    """ series of critical nodes has finished, add partial route """
-                    partial_route.append(node)
+            """ partial routes are held as offsets into the route """
+            res_routes[agent_id] = RouteFragments.from_starts(agent.route, agent.route_edges, fragment_starts)
 
-            """ if a partial route exists, append it to the rr"""
-            if partial_route:
-                collective_route.append(partial_route)
-            res_routes[agent_id] = collective_route
+        """ identify which agents are waiting on critical points held by others """
+        for frags in res_routes.values():
+            if len(frags) > 1 and frags[1][0] not in self.cpoint_owners and frags[1][0] in c_agents:
+                self.cpoint_owners[frags[1][0]] = self.shortest_route_to_node(c_agents[frags[1][0]], frags[1][0])
+        self.wait_for_graph = WaitForGraph.from_fragments(res_routes, self.cpoint_owners)
+        logmsg(category="planer", msg="   | Wait-for graph: %s" % self.wait_for_graph)
+
+        logmsg(category="planer", msg="   | All fragments identified")
+        for agent_id, frags in res_routes.items():
+            logmsg(category="planer", msg="   :   | %s:%s" % (agent_id, str(frags).replace('WayPoint','wp')))
 
         """ for each agent, apply their route fragments """
+        # if start and goal nodes are different, there will be at least one node remaining and an edge
+        # so the fragments of active robots are formatted to end before the goal and to share boundary nodes
         for agent in self.agent_details.values():
             if agent.agent_id in res_routes:
-                agent.route_fragments = res_routes[agent.agent_id]
-
-        logmsg(category="planer", msg="   | All fragments identified")
-        for a in self.agent_details.values():
-            logmsg(category="planer", msg="   :   | %s:%s" % (a.agent_id,str(a.route_fragments).replace('WayPoint','wp')))
-
-        res_edges = {}
-        # split the edges as per the route_fragments
-        """ for each active robot """
-        for agent_id in active_agents:
-            agent = self.agent_details[agent_id]
-
-            """ if the robot has route fragments """
-            if agent.route_fragments:
-
-                """ remove goal node from final fragment """
-                agent.route_fragments[-1].pop(-1)
-
-                # if start and goal nodes are different, there will be at least one node remaining and an edge
-                """ move the last node of all fragments to the start of next fragment """
-                for i in range(len(agent.route_fragments) - 1):
-                    agent.route_fragments[i+1].insert(0, agent.route_fragments[i][-1])
-                    agent.route_fragments[i].pop(-1)
-
-                """ split the edges """
-                res_edges[agent_id] = []
-                for i in range(len(agent.route_fragments)):
-                    res_edges[agent_id].append(agent.route_edges[:len(agent.route_fragments[i])])
-                    agent.route_edges = agent.route_edges[len(agent.route_fragments[i]):]
-            else:
-                agent.route_fragments = []
-                res_edges[agent_id] = []
+                frags = res_routes[agent.agent_id]
+                agent.route_fragments = frags.formatted() if agent.agent_id in active_agents else frags
 
         logmsg(category="planer", msg="   | Fragments formatted")
         for a in self.agent_details.values():
             logmsg(category="planer", msg="   :   | %s:%s" % (a.agent_id,str(a.route_fragments).replace('WayPoint','wp')))
+            logmsg(category="planer", msg="   :   | %s:%s" % (a.agent_id,a.route_fragments.edge_repr().replace('WayPoint','wp')))
 
-        """ for each agent, apply their route edges """
-        # self.route_edges = res_edges
-        for agent in self.agent_details.values():
-            if agent.agent_id in res_edges:
-                agent.route_edges = res_edges[agent.agent_id]
-
-        logmsg(category="planer", msg="   | Fragment edges formatted")
-        for a in self.agent_details.values():
-            logmsg(category="planer", msg="   :   | %s:%s" % (a.agent_id,str(a.route_edges).replace('WayPoint','wp')))
-
-    def find_routes(self, ):
+    def find_routes(self, version=None):
         """find_routes - find indiviual paths, find critical points in these paths, and fragment the
         paths at critical points - whenever triggered
-        """
-        super(FragmentPlanner, self).find_routes()
 
-        logmsg(category="route", id="PLANNER", msg="Targets")
+        :return: PlanningRequest, the completed request
+        """
+        request = self.plan_routes(self.snapshot(version))
+        self.apply_routes(request)
+        return request
 
-        A = self.agent_details.values()
-        actives = [a for a in A if a.goal()]
-        inactives = [a for a in A if not a.goal()]
-        for a in A:
-            if a().route_required: typ = 'new active'
-            else: typ = 'active' if a.goal() else 'inactive'
-            logmsg(category="route", msg="   | %s [%s] %s" % (a.agent_id, typ, '(%s)' % a.goal() if a.goal() else ''))
+    def snapshot(self, version=None):
+        """ Capture the agent details needed for planning, so that plan_routes can run off the main loop
 
-        # identify all occupied nodes
-        self.load_occupied_nodes()
+        The request is built without touching the planner's own attributes, which plan_routes may be
+        using on the planning worker. Priority overrides are taken from the last applied replan.
+        """
+        agents = {a.agent_id: AgentSnapshot(a) for a in self.agent_manager.agent_details.values() if a.location.has_presence}
+        occupied_nodes = list(set(sum(self.load_occupied_nodes(ret=True).values(), [])))
+        node_cost = self.congestion_model.node_cost() if self.congestion_model else None
+        return PlanningRequest(version, agents, occupied_nodes, self.applied_overrides, node_cost)
+
+    def plan_routes(self, request):
+        """ Find routes for the snapshot of agents in the request, the results are applied in apply_routes """
+        with self.task_lock:
+            t0 = Now()
+            self.agent_details = request.agents
+            self.occupied_nodes = request.occupied_nodes
+            self.node_cost = request.node_cost
+            self.priority_overrides = dict(request.priority_overrides)
+
+            logmsg(category="route", id="PLANNER", msg="Targets")
+
+            A = self.agent_details.values()
+            actives = [a for a in A if a.goal()]
+            inactives = [a for a in A if not a.goal()]
+            for a in A:
+                if a().route_required: typ = 'new active'
+                else: typ = 'active' if a.goal() else 'inactive'
+                logmsg(category="route", msg="   | %s [%s] %s" % (a.agent_id, typ, '(%s)' % a.goal() if a.goal() else ''))
+
+            # find unblocked routes for all agents which need one
+            if actives or inactives:
+                logmsg(category="route", msg="Routing:")
+            for agent in actives:
+                agent_id = agent.agent_id
+                agent().route_found = False
+
+                # get start node and goal node
+                start_node = agent.location(accurate=False)
+                goal_node  = agent.goal()
+
+                # if current node is goal node, mark agent as inactive
+                if start_node == goal_node: #should _query should have handled this by this point?
+                    inactives += [agent]
+                    logmsg(category="route", msg="   | %s at goal [inactive]" % agent_id)
+                    continue
 
-        # find unblocked routes for all agents which need one
-        if actives or inactives:
-            logmsg(category="route", msg="Routing:")
-        for agent in actives:
-            agent_id = agent.agent_id
-            agent().route_found = False
-
-            # get start node and goal node
-            start_node = agent.location(accurate=False)
-            goal_node  = agent.goal()
-
-            # if current node is goal node, mark agent as inactive
-            if start_node == goal_node: #should _query should have handled this by this point?
-                inactives += [agent]
-                logmsg(category="route", msg="   | %s at goal [inactive]" % agent_id)
-                continue
-
-            # unblock start and goal nodes, then update map to block other agents
-            FragmentPlanner_map_filter.generate_filtered_map(agent, start_node, goal_node, self.occupied_nodes)
-
-            # generate route from start node to goal node
-            if not ( agent.map_handler.is_node(start_node) or agent.map_handler.is_node(goal_node) ):
-                logmsg(level='error', category="route", msg="   | problem: node is not in map")
-            try:
-                route = agent.map_handler.filtered_route_search.search_route(start_node, goal_node)
-            except:
-                print(traceback.format_exc())
-                return
-
-            # if failed to find route, set robot as inactive and mark navigation as failed
-            if route.source == [] and route.edge_id == []:
-                logmsg(category="route", msg="   | %s route unavailable, executing recovery" % agent_id)
-                self.no_route_found(agent)
-                inactives += [agent]
-                agent().route_required = False
-                continue
-
-            # add goal_node as it could be a critical point
-            route_nodes = route.source + [goal_node]
-            route_edges = route.edge_id
-
-            # TODO: is thie needed anymore?
-            agent.no_route_found_notification = True
-
-            # save route details
-            agent.route = route_nodes
-            agent.route_edges = route_edges
-            agent.route_dists = agent.map_handler.get_edge_distances()
-
-            # mark route as found
-            agent().route_found = True
-
-        # secure locations for each inactive agent, to make routing not interfere
-        for agent in inactives:
-            agent.route = [agent.location(accurate=True)]
-            agent.route_edges = []
-            agent.route_dists = agent.map_handler.get_edge_distances()
-
-        # log each route
-        logmsg(category="route", msg="Results:")
-        for a in self.agent_details.values():
-            logmsg(category="route", msg="   | %s" % a.agent_id)
-            [logmsg(category="route", msg="   :   | %s" % node.replace('WayPoint', 'wp')) for node in a.route]
+                # generate route from start node to goal node
+                if not ( agent.map_handler.is_node(start_node) or agent.map_handler.is_node(goal_node) ):
+                    logmsg(level='error', category="route", msg="   | problem: node is not in map")
+                try:
+                    route = self.search_route(agent, start_node, goal_node)
+                except:
+                    print(traceback.format_exc())
+                    request.failed = True
+                    request.duration = Now() - t0
+                    return request
+
+                # if failed to find route, set robot as inactive and mark navigation as failed
+                if route.source == [] and route.edge_id == []:
+                    logmsg(category="route", msg="   | %s route unavailable, executing recovery" % agent_id)
+                    agent.recovery = 'no_route'
+                    inactives += [agent]
+                    continue
 
-        # find critical points and fragment routes to avoid critical point collisions
+                # add goal_node as it could be a critical point
+                route_nodes = route.source + [goal_node]
+                route_edges = route.edge_id
+
+                # save route details
+                agent.route = route_nodes
+                agent.route_edges = route_edges
+                agent.route_dists = self.edge_distances(agent)
+
+                # mark route as found
+                agent().route_found = True
+
+            # secure locations for each inactive agent, to make routing not interfere
+            for agent in inactives:
+                agent.route = [agent.location(accurate=True)]
+                agent.route_edges = []
+                agent.route_dists = self.edge_distances(agent)
+
+            # log each route
+            logmsg(category="route", msg="Results:")
+            for a in self.agent_details.values():
+                logmsg(category="route", msg="   | %s" % a.agent_id)
+                [logmsg(category="route", msg="   :   | %s" % node.replace('WayPoint', 'wp')) for node in a.route]
+
+            # find critical points and fragment routes to avoid critical point collisions
+            self.split_critical_paths()
+
+            # break any cycles of agents waiting on each other
+            self.resolve_deadlocks()
+
+            # keep the arbitration with the request, for the planner trace
+            request.cpoint_owners = dict(self.cpoint_owners)
+            request.wait_for = dict(self.wait_for_graph.edges)
+            request.overrides_applied = dict(self.priority_overrides)
+            request.duration = Now() - t0
+            return request
+
+    def apply_routes(self, request):
+        """ Copy the planned routes onto the agents and start any recovery behaviours, on the main loop """
+        if not request.failed:
+            self.applied_overrides = request.overrides_applied
+            for snapshot in request.agents.values():
+                agent = self.agent_manager[snapshot.agent_id]
+                if not agent or not agent(): continue
+
+                agent.route = snapshot.route
+                agent.route_edges = snapshot.route_edges
+                agent.route_dists = snapshot.route_dists
+                agent.route_fragments = snapshot.route_fragments
+                if snapshot.goal():
+                    agent().route_found = snapshot().route_found
+
+                # if failed to find route, mark navigation as failed
+                if snapshot.recovery:
+                    self.no_route_found(agent)
+                    if snapshot.recovery == 'no_route':
+                        agent().route_required = False
+
+    def edge_distances(self, agent):
+        """ find edge lengths of route (as MapObj.get_edge_distances, but for the given route) """
+        if not agent.route_edges: return []
+        return [agent.map_handler.get_edge_length(agent.route[i], agent.route[i+1]) for i in range(len(agent.route) - 1)]
+
+    def search_route(self, agent, start_node, goal_node):
+        """ Find a route which avoids nodes occupied by other agents """
+        if self.alternative_routes and agent.map_handler.route_alternatives:
+            # without congestion costs, the shortest clear route of the k shortest is the shortest clear route
+            route = agent.map_handler.route_alternatives.unblocked_route(start_node, goal_node, self.occupied_nodes, self.alternative_routes, self.node_cost)
+            if route: return route
+
+        if self.hierarchical_search and agent.map_handler.row_abstraction:
+            # search over rows and junctions, the start and goal nodes are left unblocked
+            return agent.map_handler.row_abstraction.search_route(start_node, goal_node, blocked=self.occupied_nodes, node_cost=self.node_cost)
+
+        # unblock start and goal nodes, then update map to block other agents
+        FragmentPlanner_map_filter.generate_filtered_map(agent, start_node, goal_node, self.occupied_nodes)
+        return agent.map_handler.filtered_route_search.search_route(start_node, goal_node)
+
+    def resolve_deadlocks(self):
+        """ Detect cycles in the wait-for graph and resolve them, first by reordering the
+        priority of the critical points involved, then by sending an agent to a wait node
+        """
+        cycles = self.wait_for_graph.cycles()
+        if not cycles: return
+        logmsg(category="planer", id="PLANNER", msg="Deadlock detected: %s" % [str(c) for c in cycles])
+
+        # give the agent closest to its blocked node priority over the rest of its route
+        for cycle in cycles:
+            blocked = {a: self.wait_for_graph.edges[a][1] for a in cycle}
+            winner = min(cycle, key=lambda a: (self.get_route_distance_to_node(a, blocked[a]), a))
+            route = self.agent_details[winner].route
+            for node in route[route.index(blocked[winner]):]:
+                self.priority_overrides[node] = winner
+            logmsg(category="planer", msg="   | priority given to %s from %s" % (winner, blocked[winner]))
+
+        # refragment the routes under the new priorities
         self.split_critical_paths()
 
+        # if a cycle remains, the agent furthest from its blocked node retreats
+        for cycle in self.wait_for_graph.cycles():
+            blocked = {a: self.wait_for_graph.edges[a][1] for a in cycle}
+            victim = self.agent_details[max(cycle, key=lambda a: (self.get_route_distance_to_node(a, blocked[a]), a))]
+            logmsg(category="planer", msg="   | %s retreating to resolve deadlock" % victim.agent_id)
+            victim().route_found = False
+            victim.route_fragments, victim.route_edges = RouteFragments(), []
+            victim.recovery = 'retreat'
+
 
 class FragmentPlanner_map_filter(object):
 
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+
+
+class LeaseManager(object):
+    def __init__(self):
+        """ Track which nodes each agent has been granted along its route
+
+        After each replan, an agent leases the nodes of its first route fragment. Nodes behind
+        the agent are released as its current_node advances, and the lease is extended over the
+        next fragment as soon as no other agent holds any of its nodes. This lets a waiting agent
+        continue without waiting for the next full replan.
+        """
+        self.lock = threading.Lock()
+        self.leases = {}  # {agent_id: [node, ...]} nodes held, in route order from the agent's position
+        self.holders = {}  # {node: agent_id}
+
+    @staticmethod
+    def fragment_nodes(agent, index=0):
+        """ Nodes visited while following a formatted route fragment, including the node it ends on """
+        fragments = agent.route_fragments
+        if len(fragments) <= index:
+            return [agent.location(accurate=True)] if agent.location(accurate=True) else []
+        return fragments.path(index)
+
+    def reset(self, agents):
+        """ Replace all leases with the first fragment of each agent's route """
+        with self.lock:
+            self.leases, self.holders = {}, {}
+            for agent in agents:
+                self._grant(agent.agent_id, self.fragment_nodes(agent, 0))
+
+    def _grant(self, agent_id, nodes):
+        lease = self.leases.setdefault(agent_id, [])
+        for node in nodes:
+            if node in lease: continue
+            lease.append(node)
+            self.holders[node] = agent_id
+
+    def _release(self, agent_id, nodes):
+        for node in nodes:
+            if self.holders.get(node) == agent_id:
+                del self.holders[node]
+
+    def release_behind(self, agent_id, node):
+        """ Release each node the agent has passed, keeping its current node """
+        with self.lock:
+            lease = self.leases.get(agent_id, [])
+            if node not in lease: return []
+            passed = lease[:lease.index(node)]
+            self.leases[agent_id] = lease[len(passed):]
+            self._release(agent_id, [n for n in passed if n not in self.leases[agent_id]])
+            return passed
+
+    def remove_agent(self, agent_id):
+        with self.lock:
+            self._release(agent_id, self.leases.pop(agent_id, []))
+
+    def held_by_others(self, agent_id, nodes):
+        return [n for n in nodes if self.holders.get(n, agent_id) != agent_id]
+
+    def extend(self, agent_id, nodes, occupied=None):
+        """ Grant the nodes to the agent if none are held or occupied by another agent
+
+        :param agent_id: agent requesting the nodes
+        :param nodes: nodes to be added to the lease, in route order
+        :param occupied: {agent_id: [node, ...]} occupation of every agent
+        :return: bool, True if the lease was extended
+        """
+        occupied_by_others = set(sum([o for a, o in (occupied or {}).items() if a != agent_id], []))
+        with self.lock:
+            if self.held_by_others(agent_id, nodes) or occupied_by_others.intersection(nodes):
+                return False
+            self._grant(agent_id, nodes)
+            return True
+
+    def __repr__(self):
+        return ", ".join(["%s:%s" % (a, l) for a, l in sorted(self.leases.items())]) or "empty"
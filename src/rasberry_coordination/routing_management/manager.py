@@ -5,16 +5,23 @@
 # @date:
 # ----------------------------------
 
-import time, datetime
-import rospkg
-import yaml
-from rospy import Subscriber
+import time
+from rospy import Subscriber, Service
 import traceback
 
 from std_msgs.msg import Empty
 import strands_navigation_msgs.msg
+from rasberry_coordination.srv import String as StringSrv, StringResponse
 
 from rasberry_coordination.routing_management.fragment_planner import FragmentPlanner
+from rasberry_coordination.routing_management.route_journal import RouteJournal
+from rasberry_coordination.routing_management.planner_trace import PlannerTrace
+from rasberry_coordination.routing_management.lease_manager import LeaseManager
+from rasberry_coordination.routing_management.traversal_model import TraversalModel
+from rasberry_coordination.routing_management.congestion import CongestionModel
+from rasberry_coordination.routing_management.planning_worker import PlanningWorker
+from rasberry_coordination.routing_management.route_fragments import RouteFragments
+from rasberry_coordination.task_management.modules.navigation.stage_definitions import Navigation
 from rasberry_coordination.coordinator_tools import logmsg
 
 class RoutingManager(object):
@@ -32,17 +39,57 @@ class RoutingManager(object):
         self.last_replan_time = time.time()
         self.force_replan_to_publish = False
         self.log_routes = True
+        self.route_progress = {}  # {agent_id: index of the last waypoint reported in the published route}
         self.force_replan_cb = Subscriber('/rasberry_coordination/force_replan', Empty, self.force_replan)
 
+        # Record every published route to a rotating journal for later analysis
+        journal_format = planning_format['route_journal'] if 'route_journal' in planning_format else dict()
+        self.route_journal = RouteJournal(**journal_format)
+
+        # Record the inputs and results of every replan, for offline replay
+        trace_format = planning_format['planner_trace'] if 'planner_trace' in planning_format else dict()
+        self.planner_trace = PlannerTrace(**trace_format)
+
         # Define route polanner properties
         self.planning_type = planning_format['planning_type']
         self.heterogeneous_map = planning_format['heterogeneous_map']
+        self.hierarchical_search = planning_format['hierarchical_search'] if 'hierarchical_search' in planning_format else False
+        self.alternative_routes = planning_format['alternative_routes'] if 'alternative_routes' in planning_format else 0
         self.agent_manager = agent_manager
 
+        # Release nodes behind agents as they move and extend waiting agents into freed nodes
+        self.node_leasing = planning_format['node_leasing'] if 'node_leasing' in planning_format else False
+        self.lease_manager = LeaseManager()
+
+        # Learn edge traversal times from agent movement, optionally used to arbitrate critical points
+        traversal_format = planning_format['traversal_model'] if 'traversal_model' in planning_format else dict()
+        self.eta_arbitration = planning_format['eta_arbitration'] if 'eta_arbitration' in planning_format else False
+        self.traversal_model = TraversalModel(**traversal_format)
+        self.traversal_model_srv = Service('/rasberry_coordination/traversal_model/query', StringSrv, self.query_traversal_model)
+
+        # Track how long each node is occupied, optionally used to route around busy nodes
+        congestion_format = planning_format['congestion'] if 'congestion' in planning_format else dict()
+        self.congestion_model = CongestionModel(**congestion_format)
+
+        # Plan on a dedicated thread so the coordinator loop keeps running during a replan
+        self.background_planning = planning_format['background_planning'] if 'background_planning' in planning_format else False
+        self.planning_deadline = planning_format['planning_deadline'] if 'planning_deadline' in planning_format else 5.0
+        self.replan_count = 0  # number of replans requested, part of the planning version
+        self.pending_plan = None
+
+        # Look ahead to the next navigation of each agent, so its route can be published as soon as it starts
+        self.route_prefetch = planning_format['route_prefetch'] if 'route_prefetch' in planning_format else False
+        self.prefetched = {}  # {agent_id: (start_node, goal_node)} next navigation of each agent
+
         # Construct the route planner
         planning_types = {'fragment_planner': self.fragment_planner,
                           'alternative_planner': self.alternative_planner}
         self.planner = planning_types[self.planning_type]()
+        if self.eta_arbitration: self.planner.traversal_model = self.traversal_model
+        if self.congestion_model.penalty and not (self.hierarchical_search or self.alternative_routes):
+            logmsg(level="warn", category="route", msg="congestion penalty ignored, it is only applied with hierarchical_search or alternative_routes")
+        elif self.congestion_model.penalty: self.planner.congestion_model = self.congestion_model
+        self.planning_worker = PlanningWorker(self.planner.plan_routes) if self.background_planning else None
 
     def find_routes(self):
         """ Proxy function to self.planner.find_routes()
@@ -50,18 +97,68 @@ class RoutingManager(object):
         :return: None
         """
         try:
-            self.planner.find_routes()
-            self.last_replan_time = time.time()
+            if self.planning_worker:
+                self.submit_routes()
+                return
+            self.routes_applied(self.planner.find_routes())
         except AttributeError as e:
             print(traceback.format_exc())
             logmsg(level="error", category="route", msg='find_routes encountered a problem')
 
+    def planning_version(self):
+        """ Identify the state a replan is made from, from the replans requested and the goal and stage of each agent """
+        agents = self.agent_manager.agent_details.values()
+        return (self.replan_count, tuple(sorted([(a.agent_id, a.goal(), id(a())) for a in agents])))
+
+    def submit_routes(self):
+        """ Submit a snapshot of the agents to the planning worker, replacing any replan not yet started """
+        if self.pending_plan: self.pending_plan.cancel()
+        request = self.planner.snapshot(self.planning_version())
+        self.pending_plan = self.planning_worker.submit(request, self.planning_deadline)
+
+    def collect_routes(self):
+        """ Apply the result of a background replan once complete, dropping it if the agents have since changed
+
+        :return: bool, True if new routes were applied
+        """
+        future = self.pending_plan
+        if not future: return False
+
+        if future.expired() and not future.reported_late:
+            future.reported_late = True
+            logmsg(level="warn", category="route", id="PLANNER", msg="Replanning has exceeded its deadline of %ss" % self.planning_deadline)
+        if not future.done(): return False
+        self.pending_plan = None
+
+        if future.error:
+            print(future.error)
+            logmsg(level="error", category="route", msg='find_routes encountered a problem')
+            return False
+
+        if future.request.version != self.planning_version():
+            logmsg(category="route", id="PLANNER", msg="Replanning result is stale, replanning again")
+            self.trigger_fresh_replan = True
+            return False
+
+        self.planner.apply_routes(future.result)
+        self.routes_applied(future.result)
+        logmsg(category="route", id="PLANNER", msg="Routes applied (%.2fs after request)" % (time.time() - future.submitted))
+        return True
+
+    def routes_applied(self, request):
+        self.last_replan_time = time.time()
+        self.planner_trace.record_plan(request)
+        if self.node_leasing:
+            self.lease_manager.reset([a for a in [self.agent_manager[i] for i in request.agents] if a])
+            logmsg(category="route", msg="   | Leases: %s" % self.lease_manager)
+
     def fragment_planner(self):  # TODO: add direct object creation in __init__
         """ Create a FragmentPlanner object and populate it with the pointers to the agent managers and the callbacks
 
         :return: FragmentPlanner
         """
-        return FragmentPlanner(self.agent_manager, self.heterogeneous_map)
+        return FragmentPlanner(self.agent_manager, self.heterogeneous_map, hierarchical_search=self.hierarchical_search,
+                               alternative_routes=self.alternative_routes)
 
     def alternative_planner(self):
         """ Example function to show how planning_types dict can be expanded in __init__
@@ -73,6 +170,136 @@ class RoutingManager(object):
         # return alternative_planner(self.agent_manager, self.heterogeneous_map)
 
 
+    def location_update(self, agent, stamp=None):
+        """ Learn traversal times and occupancy, and release the nodes an agent has moved past, called on each current_node update
+
+        :param stamp: time the update arrived, as it may be handled later by the coordinator loop
+        """
+        self.traversal_model.observe(agent, stamp)
+        self.congestion_model.observe(agent.agent_id, agent.location.current_node, stamp)
+        if not self.node_leasing: return
+        node = agent.location.current_node
+        if node and self.lease_manager.release_behind(agent.agent_id, node):
+            logmsg(category="route", id=agent.agent_id, msg="Lease released behind %s" % node)
+
+    def extend_leases(self, A):
+        """ Extend the active fragment of waiting agents over their next fragment once it is free
+
+        The next fragment is appended to the active fragment, trimmed to the agent's current position,
+        and flagged for publishing so the agent continues without waiting for a full replan.
+        """
+        if not self.node_leasing: return
+        waiting = [a for a in A if len(getattr(a, 'route_fragments', [])) > 1 and a.goal() and not a().route_found]
+        if not waiting: return
+
+        occupied = self.planner.load_occupied_nodes(ret=True)
+        for agent in waiting:
+            if not self.lease_manager.extend(agent.agent_id, self.lease_manager.fragment_nodes(agent, 1), occupied):
+                continue
+
+            # Merge the next fragment into the active fragment
+            agent.route_fragments.merge_next(0)
+            agent.route_fragments.trim(agent.location(accurate=True), 0)
+
+            logmsg(category="route", id=agent.agent_id, msg="Lease extended, continuing to %s" % self.lease_manager.fragment_nodes(agent, 0)[-1])
+            agent().route_found = True
+
+    def next_navigation(self, agent):
+        """ Find the next navigation of an agent with a known target, from its active task then its task buffer
+
+        :return: (start_node, goal_node), or None if an earlier navigation has a target not yet known
+        """
+        start = (agent.goal() if agent() else None) or agent.location(accurate=True)
+
+        # targets may also be given by the contacts of the active task
+        contacts = agent['contacts'] or dict()
+        stages = [(s, contacts) for s in (agent['stage_list'] or [])[1:]]
+        stages += [(s, dict()) for s in (agent.task_buffer[0]['stage_list'] if agent.task_buffer else [])]
+
+        for stage, contacts in stages:
+            if not isinstance(stage, Navigation): continue  # only navigation stages move the agent
+            target = stage.target or contacts.get(stage.association)
+            if stage.target_agent or not target or not agent.map_handler.is_node(target): return None
+            if target != start: return (start, target)
+        return None
+
+    def prefetch_routes(self, A):
+        """ While the planner is idle, compute the routes for the next navigation of each agent
+
+        Routes are held in the route_alternatives cache of each map, so checking them at the start of
+        the navigation stage is a cache lookup.
+        """
+        if not self.route_prefetch: return
+        self.prefetched = {}
+        for agent in A:
+            if not agent.map_handler.route_alternatives: continue
+            navigation = self.next_navigation(agent)
+            if not navigation: continue
+            agent.map_handler.route_alternatives.k_shortest(navigation[0], navigation[1], max(self.alternative_routes, 1))
+            self.prefetched[agent.agent_id] = navigation
+
+    def apply_prefetched_routes(self, A):
+        """ Give agents starting their prefetched navigation its route, if it is clear of every other agent
+
+        The route is applied as a single fragment and flagged for publishing, so no replan is needed.
+        This is only safe while every other agent has its route: the prefetched route avoids those routes,
+        so arbitration would find no critical points on it. If any other agent is waiting on a route (or a
+        replan is in progress) the agents are left for the planner as normal, so critical points between
+        them are arbitrated.
+        """
+        if not self.route_prefetch: return
+        starting = [a for a in A if a().route_required and self.prefetched.get(a.agent_id) == (a.location(accurate=False), a.goal())]
+        if not starting: return
+        if self.pending_plan or any([a().route_required for a in A if a not in starting]): return
+
+        occupied = self.planner.load_occupied_nodes(ret=True)
+        for agent in starting:
+            start, goal = self.prefetched.pop(agent.agent_id)
+
+            # nodes held, planned through or targeted by any other agent
+            others = [a for a in self.agent_manager.agent_details.values() if a is not agent]
+            blocked = set(sum([occupied.get(a.agent_id, []) + getattr(a, 'route', []) for a in others], []))
+            blocked.update([a.goal() for a in others if a()])
+            if goal in blocked: continue
+
+            route = agent.map_handler.route_alternatives.unblocked_route(start, goal, blocked, max(self.alternative_routes, 1))
+            if not route: continue
+
+            agent.route, agent.route_edges = route.source + [goal], route.edge_id
+            agent.route_dists = self.planner.edge_distances(agent)
+            agent.route_fragments = RouteFragments(agent.route, agent.route_edges, [(0, len(agent.route))]).formatted()
+            if self.node_leasing:
+                self.lease_manager.remove_agent(agent.agent_id)
+                self.lease_manager.extend(agent.agent_id, self.lease_manager.fragment_nodes(agent, 0))
+
+            logmsg(category="route", id=agent.agent_id, msg="Prefetched route applied, %s to %s" % (start, goal))
+            agent().route_found = True
+            agent().route_required = False
+
+    def query_traversal_model(self, req):
+        """ Service to inspect the traversal model, see TraversalModel.query for the request format """
+        resp = StringResponse()
+        resp.msg = "\n".join(self.traversal_model.query(req.data))
+        resp.success = True
+        return resp
+
+    def update_route_progress(self, agent, route_nodes):
+        """ Find the index of the agent's last reported waypoint in its published route
+
+        Feedback from the execute_policy_mode action only moves forward, so the search starts from
+        the last index found. Agents without feedback remain at the start of their route.
+        """
+        index = self.route_progress.get(agent.agent_id, 0)
+        if index >= len(route_nodes): index = 0
+        wp = getattr(agent.modules['navigation'].interface, 'execpolicy_current_wp', None)
+        if wp:
+            for i in range(index, len(route_nodes)):
+                if route_nodes[i] == wp:
+                    index = i
+                    break
+        self.route_progress[agent.agent_id] = index
+        return index
+
     """ Publish route if different from current """
     def publish_routes(self, agent, trigger=False):
         logmsg(category="navig", id=agent.agent_id, msg="Attempting to publish route.")
@@ -81,8 +308,8 @@ class RoutingManager(object):
         policy = strands_navigation_msgs.msg.ExecutePolicyModeGoal()
 
         """ Define route, if no new route is generated, dont do anything. """
-        policy.route.source = agent.route_fragments[0] if agent.route_fragments else None
-        policy.route.edge_id = agent.route_edges[0] if agent.route_edges else None
+        policy.route.source = list(agent.route_fragments[0]) if agent.route_fragments else None
+        policy.route.edge_id = list(agent.route_fragments.edges(0)) if agent.route_fragments else None
 
         """ Flag to identify if new route is the same and should not be re-published """
         publish_route = True #assume route is identical
@@ -104,40 +331,36 @@ class RoutingManager(object):
             publish_route = False  #assume new route is the same, so no need to publish
             reason_failed_to_publish = "Routes are same."
 
-            """ Do lists have different lengths? """
-            # old: R========T
+            """ Is the new route longer than the part of the old route still to be followed? """
+            # old: ==R======T
             # new:     R====T
-            if len(new_edge) > len(old_edge):
+            remaining = len(old_edge) - self.update_route_progress(agent, old_node)
+            if len(new_edge) > remaining:
                 publish_route = True
-                rationalle_to_publish = "New route is larger then old route."
-                logmsg(category="navig", msg="   | new route longer than existing one")
+                rationalle_to_publish = "New route is larger then remaining route."
+                logmsg(category="navig", msg="   | new route longer than remaining route")
             else:
                 publish_route = False
                 reason_failed_to_publish = "New shorter route could just be a partially used route"
 
 
-            """ Compare routes for any differences from target to start. """
+            """ Is the new route the end of the remaining route? """
             if not publish_route:
-                N = new_edge[::-1] #reverse
-                O = old_edge[::-1] #reverse
-                paired = zip(O[0:len(N)], N)  #trim old route
-
-                for o, n in paired:
-                    if o != n:
-                        publish_route = True
-                        rationalle_to_publish = "New route takes a different route to target."
-                        logmsg(category="navig", msg="   | new route different from existing route")
-                        break
-                    else:
-                        publish_route = False
-                        reason_failed_to_publish = "Old route uses same path as new route."
+                offset = len(old_edge) - len(new_edge)
+                if any([old_edge[offset + i] != e for i, e in enumerate(new_edge)]):
+                    publish_route = True
+                    rationalle_to_publish = "New route takes a different route to target."
+                    logmsg(category="navig", msg="   | new route different from existing route")
+                else:
+                    reason_failed_to_publish = "Old route uses same path as new route."
 
         """ If publish_route is True, routes are different """
         if publish_route or self.force_replan_to_publish:
             self.force_replan_to_publish = False
+            self.route_journal.record(agent.agent_id, new_node, new_edge, rationalle_to_publish or "forced")
             if self.log_routes:
-                new_policy = policy.route.source
-                if policy.route.edge_id: new_policy += [policy.route.edge_id[-1].split('_')[1]]
+                new_policy = list(policy.route.source)
+                if policy.route.edge_id: new_policy += [(agent.map_handler.get_edge_nodes(policy.route.edge_id[-1]) or [None, '?'])[1]]
                 logmsg(category="navig",  msg="   | New Route:")
                 [logmsg(category="navig", msg="   :   | %s" % n) for n in new_policy]
                 if not new_policy:
@@ -148,8 +371,8 @@ class RoutingManager(object):
                 if not oldy:
                     logmsg(category="navig",  msg="   :   | (empty)")
                 else:
-                    old_policy = oldy.route.source
-                    if oldy.route.edge_id: old_policy += [oldy.route.edge_id[-1].split('_')[1]]
+                    old_policy = list(oldy.route.source)
+                    if oldy.route.edge_id: old_policy += [(agent.map_handler.get_edge_nodes(oldy.route.edge_id[-1]) or [None, '?'])[1]]
                     [logmsg(category="navig", msg="   :   | %s" % n) for n in old_policy]
                     if not old_policy:
                         logmsg(category="navig", msg="   :   | (empty)")
@@ -157,6 +380,7 @@ class RoutingManager(object):
 
             agent.modules['navigation'].interface.cancel_execpolicy_goal()
             agent.modules['navigation'].interface.set_execpolicy_goal(policy)
+            self.route_progress[agent.agent_id] = 0
             if 'rasberry_health_monitoring_pkg' in agent.modules:
                 if agent.modules['rasberry_health_monitoring_pkg'].interface.is_navigation_available():
                     agent.speaker("caution: moving")
@@ -166,11 +390,6 @@ class RoutingManager(object):
             agent().route_required = False  # Route has now been published
             logmsg(category="navig", id=agent.agent_id, msg="   | route published: %s" % rationalle_to_publish)
 
-            now = str(datetime.datetime.utcnow())
-            path = "%s/routing/filtered_map_%s.prof" % (rospkg.RosPack().get_path('rasberry_coordination'), now.replace(' ','-'))
-            with open("output_file.txt", "w") as f_handle:
-                yaml.dump(policy, f_handle)
-
         else:
             logmsg(category="navig", id=agent.agent_id, msg="   | route failed to published: %s" % reason_failed_to_publish)
 
@@ -179,15 +398,20 @@ class RoutingManager(object):
 
     def force_replan(self, msg=None):
         logmsg(category="route", id="PLANNER", msg="Replanning [forced]")
+        self.replan_count += 1
         self.trigger_fresh_replan = True
         self.force_replan_to_publish = True
 
     def trigger_replan(self):
         logmsg(category="route", id="PLANNER", msg="Replanning [trigger]")
+        self.replan_count += 1
         self.trigger_fresh_replan = True
 
     def trigger_routing(self, A):
-        if self.trigger_fresh_replan:
+        if self.pending_plan and self.pending_plan.request.version == self.planning_version():
+            return False  # a replan of the current state is already in progress
+
+        elif self.trigger_fresh_replan:
             self.trigger_fresh_replan = False
 
         elif any([a().route_required for a in A]):
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+import yaml
+
+from topological_navigation.route_search2 import TopologicalRouteSearch2 as TopologicalRouteSearch
+from rasberry_coordination.topomap_management.row_abstraction import RowAbstraction
+from rasberry_coordination.topomap_management.edge_index import EdgeIndex
+from rasberry_coordination.topomap_management.route_alternatives import RouteAlternatives
+
+
+class SharedMap(object):
+    def __init__(self, raw_msg):
+        """ Read-only structures derived from a single map message
+
+        Every agent subscribed to the same map topic (ie. with the same restriction class) references
+        the same SharedMap. Structures are built on first use, as not every map needs every structure.
+        """
+        self.raw_msg = raw_msg
+        self.tmap = yaml.safe_load(raw_msg)
+        self.node_list = [node["node"]["name"] for node in self.tmap['nodes']]
+        self._route_search = None
+        self._row_abstraction = None
+        self._edge_index = None
+        self._route_alternatives = None
+
+    @property
+    def route_search(self):
+        if not self._route_search:
+            self._route_search = TopologicalRouteSearch(self.tmap)
+        return self._route_search
+
+    @property
+    def edge_index(self):
+        if not self._edge_index:
+            self._edge_index = EdgeIndex(self.tmap)
+        return self._edge_index
+
+    @property
+    def route_alternatives(self):
+        if not self._route_alternatives:
+            self._route_alternatives = RouteAlternatives(self.edge_index)
+        return self._route_alternatives
+
+    @property
+    def row_abstraction(self):
+        if not self._row_abstraction:
+            self._row_abstraction = RowAbstraction(self.tmap)
+        return self._row_abstraction
+
+
+class MapRegistry(object):
+    def __init__(self):
+        """ Single store of SharedMap objects for each map topic """
+        self.lock = threading.Lock()
+        self.maps = {}  # {topic: SharedMap}
+
+    def load(self, topic, raw_msg):
+        """ Get the SharedMap for a map message, building it only if the topic has not had this message yet """
+        with self.lock:
+            shared = self.maps.get(topic)
+            if not shared or shared.raw_msg != raw_msg:
+                shared = self.maps[topic] = SharedMap(raw_msg)
+            return shared
+
+    def __repr__(self):
+        return ", ".join(["%s(%i nodes)" % (t, len(m.node_list)) for t, m in sorted(self.maps.items())]) or "empty"
+
+
+# All MapObj instances share the same registry
+map_registry = MapRegistry()
@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+""" Minimal agent containers to drive the route planners without a live ROS system
+
+The planners only use a small part of AgentDetails (location, map_handler, the active
+stage and the navigation occupation), these classes provide just that part so that
+planners can be benchmarked and replayed offline.
+"""
+
+import rasberry_coordination.task_management.__init__ as task_init
+if not hasattr(task_init, 'Stages'):
+    task_init.load_custom_modules([])
+
+from rasberry_coordination.agent_management.location_handler import LocationObj as Location
+from rasberry_coordination.topomap_management.map_handler import MapObj as Map
+from rasberry_coordination.task_management.containers.Task import TaskObj as Task
+from rasberry_coordination.task_management.__init__ import Stages
+
+
+class RawMsg(object):
+    """ Stand-in for std_msgs/String as received by the map callbacks """
+    def __init__(self, data):
+        self.data = data
+
+
+class OfflineNavigator(object):
+    """ Navigation interface which occupies only the agent's current node """
+    def __init__(self, agent):
+        self.agent = agent
+        self.execpolicy_goal = None
+    def occupation(self):
+        if not self.agent.location.has_presence: return []
+        node = self.agent.location(accurate=False)
+        return [node] if node else []
+    def cancel_execpolicy_goal(self): self.execpolicy_goal = None
+    def set_execpolicy_goal(self, goal): self.execpolicy_goal = goal
+
+
+class OfflineModule(object):
+    def __init__(self, interface, details=None):
+        self.interface = interface
+        self.details = details or dict()
+
+
+class OfflineAgent(object):
+    def __init__(self, agent_id, raw_map, start_node, goal_node=None, has_presence=True, agent_class=None):
+        self.agent_id = agent_id
+        self.cb = dict()
+        self.agent_class = agent_class
+        self.location = Location(self, has_presence=has_presence, initial_location=start_node)
+        self.modules = {'navigation': OfflineModule(OfflineNavigator(self))}
+        self.task_buffer = []
+        self.interruption = None
+        self.registration = True
+
+        # Route containers filled by the planner
+        self.route, self.route_edges, self.route_dists, self.route_fragments = [], [], [], []
+
+        # Load the same map the coordinator would receive
+        self.map_handler = Map(agent=self)
+        self.map_handler.global_map_cb(RawMsg(raw_map))
+        self.map_handler.local_map_cb(RawMsg(raw_map))
+
+        self.set_goal(goal_node)
+
+    def set_goal(self, goal_node):
+        """ Replace the active task with navigation to goal_node, or idle if None """
+        if goal_node:
+            stage = Stages['navigation']['NavigateToNode'](self, target=goal_node)
+            stage.route_required, stage.new_stage = True, False
+        else:
+            stage = Stages['base']['Idle'](self)
+        self.task = Task(id='%s_offline' % self.agent_id, name='offline', stage_list=[stage])
+
+    def goal(self):
+        if self().target_agent:
+            return self().target_agent.location(accurate=True)
+        return self().target
+
+    def __call__(self, index=0):
+        if index:
+            return self.task.stage_list[index] if len(self.task.stage_list) > index else None
+        return self.task.stage_list[0] if self.task.stage_list else None
+    def __getitem__(self, key): return self.task[key] if self.task else None
+    def __setitem__(self, key, val): self.task[key] = val
+    def speaker(self, msg): pass
+
+
+class OfflineAgentManager(object):
+    """ Stand-in for AgentManager, holding only the agent_details dictionary """
+    def __init__(self, agents=None):
+        self.cb = dict()
+        self.agent_details = {a.agent_id: a for a in (agents or [])}
+    def __getitem__(self, key):
+        return self.agent_details[key] if key in self.agent_details else None
+    def get_agent_list_copy(self):
+        return self.agent_details.copy()
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import json
+from time import time as Now
+
+from rasberry_coordination.routing_management.route_journal import RouteJournal
+
+
+class PlannerTrace(RouteJournal):
+    def __init__(self, filepath='planner_trace.jsonl', max_bytes=50*1024*1024, backups=3, enabled=False):
+        """ Record of the inputs and results of every replan, to be replayed by scripts/replay_planner_trace.py
+
+        Records share the RouteJournal writer and rotation, and are one of two types:
+            {"type": "map", "t", "topic", "map"} the raw map of a topic, written before the first plan using it
+            {"type": "plan", "t", "duration", "failed", "occupied", "overrides", "node_cost", "agents", "results",
+             "cpoint_owners", "wait_for"} a single replan
+
+        Each file is self-contained, as the writer records a map before the first plan in the file which uses it,
+        and again whenever the map of a topic has changed.
+        """
+        super(PlannerTrace, self).__init__(filepath=filepath, max_bytes=max_bytes, backups=backups, enabled=enabled)
+        self.maps = {}  # {topic: raw_msg} last map written to the current file for each topic, used by the writer
+
+    def record_plan(self, request):
+        """ Queue a record of a completed PlanningRequest """
+        if not self.enabled or not request: return
+
+        agents, results, maps = {}, {}, {}
+        for agent_id, a in request.agents.items():
+            maps[a.map_handler.topic] = a.map_handler.raw_msg
+            agents[agent_id] = {'map': a.map_handler.topic,
+                                'current': a.location.current_node,
+                                'closest': a.location.closest_node,
+                                'goal': a.goal(),
+                                'route_required': a().route_required}
+            results[agent_id] = {'route': list(a.route),
+                                 'edges': list(a.route_edges),
+                                 'bounds': list(getattr(a.route_fragments, 'bounds', [])),
+                                 'recovery': a.recovery}
+
+        self.queue.put({'type': 'plan', 't': round(Now(), 3),
+                        'duration': round(request.duration, 4),
+                        'failed': request.failed,
+                        'occupied': list(request.occupied_nodes),
+                        'overrides': request.priority_overrides,
+                        'node_cost': request.node_cost,
+                        'agents': agents,
+                        'results': results,
+                        'cpoint_owners': request.cpoint_owners,
+                        'wait_for': request.wait_for,
+                        'maps': maps})
+
+    def _open(self):
+        self.maps = {}  # record the maps again at the start of each file
+        return super(PlannerTrace, self)._open()
+
+    def _write(self, handle, record):
+        """ Write the maps a plan uses ahead of it, unless already written to this file """
+        for topic, raw_msg in record.pop('maps', {}).items():
+            if self.maps.get(topic) != raw_msg:
+                self.maps[topic] = raw_msg
+                super(PlannerTrace, self)._write(handle, {'type': 'map', 't': record['t'], 'topic': topic, 'map': raw_msg})
+        super(PlannerTrace, self)._write(handle, record)
+
+
+def load_trace(filepath):
+    """ Read a trace into a list of plan records, each with the raw map of every topic it uses under 'maps'
+
+    :param filepath: trace written by PlannerTrace
+    :return: list of plan records, plans using a map not present in the file are skipped
+    """
+    maps, plans = {}, []
+    with open(filepath) as handle:
+        for line in handle:
+            if not line.strip(): continue
+            record = json.loads(line)
+            if record['type'] == 'map':
+                maps[record['topic']] = record['map']
+            elif record['type'] == 'plan':
+                topics = set([a['map'] for a in record['agents'].values()])
+                if not topics.issubset(maps): continue
+                record['maps'] = {t: maps[t] for t in topics}
+                plans.append(record)
+    return plans
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading, traceback
+from copy import copy, deepcopy
+from time import time as Now
+
+from topological_navigation.route_search2 import TopologicalRouteSearch2 as TopologicalRouteSearch
+
+from rasberry_coordination.routing_management.route_fragments import RouteFragments
+
+try: from Queue import Queue
+except ImportError: from queue import Queue
+
+
+class StageSnapshot(object):
+    """ Routing flags of an agent's active stage """
+    def __init__(self, stage):
+        self.name = str(stage)
+        self.route_required = stage.route_required if stage else False
+        self.route_found = stage.route_found if stage else False
+    def __repr__(self): return self.name
+
+
+class PlanningMap(object):
+    def __init__(self, map_handler):
+        """ View of an agent's map for the planner, holding its own filtered map
+
+        The filtered map and its route search are rebuilt by the planner for each route it searches,
+        so they are kept here rather than on the agent's map, which the main loop and the map callbacks
+        use. Anything else is read from the agent's map, as loaded when the snapshot was taken.
+        """
+        self.map_handler = map_handler
+        self.empty_map = map_handler.empty_map
+        self.filtered_map = None
+        self.filtered_route_search = None
+        self.filtered_node_list = None
+
+    def __getattr__(self, name):
+        return getattr(self.map_handler, name)
+
+    def start_map_reset(self):
+        self.filtered_map = deepcopy(self.empty_map)
+
+    def complete_map_reset(self):
+        self.filtered_route_search = TopologicalRouteSearch(self.filtered_map)
+        self.filtered_node_list = [node["node"]["name"] for node in self.filtered_map['nodes']]
+
+
+class AgentSnapshot(object):
+    def __init__(self, agent):
+        """ Copy of the parts of an agent read by the planner, so planning can run away from the main loop
+
+        Modules are referenced rather than copied, as the planner does not use them. Maps are wrapped
+        in a PlanningMap, so filtering a map for a search leaves the agent's map untouched, and route
+        fragments are copied, so the planner and the main loop never share them.
+        """
+        self.agent_id = agent.agent_id
+        self.location = copy(agent.location)
+        self.map_handler = PlanningMap(agent.map_handler)
+        self.modules = agent.modules
+        self.stage = StageSnapshot(agent())
+        self.target = agent.goal()
+
+        # Route containers, filled by the planner
+        self.route = list(getattr(agent, 'route', []))
+        self.route_edges = list(getattr(agent, 'route_edges', []))
+        self.route_dists = list(getattr(agent, 'route_dists', None) or [])
+        fragments = getattr(agent, 'route_fragments', None) or RouteFragments()
+        self.route_fragments = RouteFragments(list(fragments.route), list(fragments.route_edges), list(fragments.bounds))
+        self.recovery = None  # ['no_route', 'retreat'] recovery behaviour to be applied to the agent
+
+    def goal(self): return self.target
+    def __call__(self): return self.stage
+
+
+class PlanningRequest(object):
+    def __init__(self, version, agents, occupied_nodes, priority_overrides=None, node_cost=None):
+        """ Inputs of a single replan
+
+        :param version: identifies the state the request was made from, results are stale if it has changed
+        :param agents: {agent_id: AgentSnapshot}
+        :param occupied_nodes: list of nodes occupied by any agent
+        :param priority_overrides: {node: agent_id} arbitration enforced when the request was made
+        :param node_cost: {node: cost} congestion cost of entering each node
+        """
+        self.version = version
+        self.agents = agents
+        self.occupied_nodes = occupied_nodes
+        self.priority_overrides = dict(priority_overrides or {})
+        self.node_cost = node_cost or {}
+        self.failed = False
+
+        # Arbitration results, filled by the planner
+        self.duration = 0.0
+        self.cpoint_owners = {}
+        self.wait_for = {}
+        self.overrides_applied = {}  # priority overrides in force after the replan, including new deadlock resolutions
+
+
+class PlanningFuture(object):
+    """ Result of a PlanningRequest which is being processed by the PlanningWorker """
+    def __init__(self, request, deadline):
+        self.request = request
+        self.submitted = Now()
+        self.deadline = self.submitted + deadline
+        self.cancelled = False
+        self.reported_late = False
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self): return self._done.is_set()
+    def expired(self): return not self.done() and Now() > self.deadline
+    def cancel(self): self.cancelled = True
+
+    def set_result(self, result, error=None):
+        self.result, self.error = result, error
+        self._done.set()
+
+
+class PlanningWorker(object):
+    def __init__(self, plan):
+        """ Dedicated thread to process PlanningRequests in submission order
+
+        :param plan: function to call with each PlanningRequest, returning the result
+        """
+        self.plan = plan
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self._run, name="planning_worker")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, request, deadline):
+        """ Queue a request, results are expected within deadline seconds """
+        future = PlanningFuture(request, deadline)
+        self.queue.put(future)
+        return future
+
+    def _run(self):
+        while True:
+            future = self.queue.get()
+            if future is None: return
+            if future.cancelled: continue
+            try:
+                future.set_result(self.plan(future.request))
+            except Exception:
+                future.set_result(None, error=traceback.format_exc())
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(5)
@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+
+class FragmentView(object):
+    def __init__(self, items, start, end):
+        """ Read-only view of items[start:end], without copying the items """
+        self.items, self.start, self.end = items, start, min(end, len(items))
+
+    def __len__(self): return max(self.end - self.start, 0)
+    def __iter__(self): return (self.items[i] for i in range(self.start, self.end))
+    def __contains__(self, item): return self.index(item) is not None
+    def __add__(self, other): return list(self) + list(other)
+    def __eq__(self, other): return list(self) == list(other)
+    def __ne__(self, other): return not self == other
+    def __repr__(self): return str(list(self))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return list(self)[i]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("fragment index out of range")
+        return self.items[self.start + i]
+
+    def index(self, item):
+        """ Position of item within the view (or None if it is not in the view) """
+        for i in range(self.start, self.end):
+            if self.items[i] == item: return i - self.start
+        return None
+
+
+class RouteFragments(object):
+    def __init__(self, nodes=None, edges=None, bounds=None):
+        """ Route of an agent split into fragments, stored as offset ranges into the full route
+
+        :param nodes: full list of route nodes (the route, ending on the goal)
+        :param edges: full list of route edges, edges[i] joins nodes[i] to nodes[i+1]
+        :param bounds: [(start, end), ...] range of each fragment, applied to both nodes and edges
+        """
+        self.route = nodes or []
+        self.route_edges = edges or []
+        self.bounds = bounds or []
+
+    @classmethod
+    def from_starts(cls, nodes, edges, starts):
+        """ Partition the route into fragments beginning at each of the start indices """
+        ends = starts[1:] + [len(nodes)]
+        return cls(nodes, edges, list(zip(starts, ends)) if nodes else [])
+
+    def formatted(self):
+        """ Fragments as published: the goal node is removed from the final fragment, and the last
+        node of each fragment is moved to the start of the next, so each edge belongs to one fragment
+        """
+        return RouteFragments(self.route, self.route_edges, [(max(s - 1, 0), e - 1) for s, e in self.bounds])
+
+    def __len__(self): return len(self.bounds)
+    def __iter__(self): return (self[i] for i in range(len(self)))
+    def __repr__(self): return str([list(f) for f in self])
+
+    def __getitem__(self, i):
+        """ Nodes of fragment i """
+        s, e = self.bounds[i]
+        return FragmentView(self.route, s, e)
+
+    def edges(self, i):
+        """ Edges of fragment i """
+        s, e = self.bounds[i]
+        return FragmentView(self.route_edges, s, e)
+
+    def path(self, i):
+        """ Nodes visited while following fragment i, including the node it ends on """
+        s, e = self.bounds[i]
+        return self.route[s:e + 1]
+
+    def merge_next(self, i=0):
+        """ Join fragment i with the fragment which follows it """
+        self.bounds[i:i + 2] = [(self.bounds[i][0], self.bounds[i + 1][1])]
+
+    def trim(self, node, i=0):
+        """ Drop the nodes of fragment i before the given node, if it is in the fragment """
+        offset = self[i].index(node)
+        if offset: self.bounds[i] = (self.bounds[i][0] + offset, self.bounds[i][1])
+
+    def edge_repr(self):
+        return str([list(self.edges(i)) for i in range(len(self))])
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import os, json, threading, traceback
+from time import time as Now
+
+try: from Queue import Queue
+except ImportError: from queue import Queue
+
+from rasberry_coordination.coordinator_tools import logmsg
+
+
+class RouteJournal(object):
+    def __init__(self, filepath='route_journal.jsonl', max_bytes=10*1024*1024, backups=3, enabled=True):
+        """ Append-only record of every published route, written from a background thread
+
+        Each record is a single compact JSON line: {"t", "agent", "source", "edges", "reason"}.
+        Once the journal exceeds max_bytes it is rotated to filepath.1 ... filepath.{backups}.
+
+        :param filepath: journal location (relative paths resolve to $HOME/.ros when run via roslaunch)
+        :param max_bytes: size at which the journal is rotated
+        :param backups: number of rotated journals to keep
+        :param enabled: if False, records are discarded
+        """
+        self.filepath = filepath
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = enabled
+
+        self.queue = Queue()
+        self.writer = None
+        if self.enabled:
+            self.writer = threading.Thread(target=self._write_loop, name='route_journal')
+            self.writer.daemon = True
+            self.writer.start()
+
+    def record(self, agent_id, source, edges, reason=''):
+        """ Queue a route record, this is the only part of the journal run in the coordinator loop """
+        if not self.enabled: return
+        self.queue.put({'t': round(Now(), 3), 'agent': agent_id, 'source': list(source or []),
+                        'edges': list(edges or []), 'reason': reason})
+
+    def close(self):
+        """ Flush any queued records and stop the writer """
+        if not self.writer: return
+        self.queue.put(None)
+        self.writer.join(timeout=5)
+        self.writer = None
+
+    def _write_loop(self):
+        handle = None
+        try:
+            while True:
+                record = self.queue.get()
+                if record is None: break
+                if not handle: handle = self._open()
+                self._write(handle, record)
+
+                # Only flush once the backlog is cleared, to batch bursts of routes together
+                if self.queue.empty():
+                    handle.flush()
+
+                if handle.tell() > self.max_bytes:
+                    handle.close()
+                    self._rotate()
+                    handle = None
+        except Exception:
+            print(traceback.format_exc())
+            logmsg(level="error", category="route", id="PLANNER", msg="Route journal writer has stopped")
+        finally:
+            if handle: handle.close()
+
+    def _open(self):
+        """ Open the journal for the next record, called on the writer thread when a file is started or continued """
+        return open(self.filepath, 'a')
+
+    def _write(self, handle, record):
+        """ Write a single record, called on the writer thread """
+        handle.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists('%s.%i' % (self.filepath, i)):
+                os.rename('%s.%i' % (self.filepath, i), '%s.%i' % (self.filepath, i + 1))
+        if self.backups:
+            os.rename(self.filepath, '%s.1' % self.filepath)
+        else:
+            os.remove(self.filepath)
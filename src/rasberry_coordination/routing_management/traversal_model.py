@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+from time import time as Now
+
+
+def agent_class(agent):
+    """ Agents sharing a navigation restriction (or, without one, a navigation interface) move alike """
+    navigation = agent.modules['navigation']
+    if 'restrictions' in navigation.details:
+        return str(navigation.details['restrictions'])
+    return navigation.interface.__class__.__name__
+
+
+class TraversalModel(object):
+    def __init__(self, decay=0.3, default_speed=0.5, max_duration=300.0):
+        """ Online estimate of the time taken to traverse each edge, per class of agent
+
+        Each time an agent arrives at a node, the time since it left the previous node is folded
+        into an exponentially weighted average for that edge and agent class. Edges with no
+        observations are estimated from their length and the average speed observed for the class.
+
+        :param decay: weight given to each new observation [0-1]
+        :param default_speed: speed (m/s) assumed for a class with no observations
+        :param max_duration: observations longer than this (s) are ignored as the agent was not travelling
+        """
+        self.lock = threading.Lock()
+        self.decay = decay
+        self.default_speed = default_speed
+        self.max_duration = max_duration
+
+        self.edge_times = {}  # {(agent_class, from_node, to_node): [seconds, samples]}
+        self.class_speeds = {}  # {agent_class: [m/s, samples]}
+        self.departures = {}  # {agent_id: (node, time)} last node each agent was seen leaving
+
+    def _blend(self, store, key, value):
+        if key in store:
+            store[key] = [(1 - self.decay) * store[key][0] + self.decay * value, store[key][1] + 1]
+        else:
+            store[key] = [value, 1]
+
+    def observe(self, agent, stamp=None):
+        """ Update the model from the latest current_node of an agent, called on each current_node update """
+        stamp = Now() if stamp is None else stamp
+        node = agent.location.current_node
+        with self.lock:
+            if node is None:
+                # Agent has left its node, so start timing from here (repeated updates keep the first time)
+                previous = agent.location.previous_node
+                if previous and self.departures.get(agent.agent_id, [None])[0] != previous:
+                    self.departures[agent.agent_id] = (previous, stamp)
+                return
+
+            departure = self.departures.pop(agent.agent_id, None)
+            if not departure or departure[0] == node: return
+            duration = stamp - departure[1]
+            if not (0 < duration < self.max_duration): return
+
+            # Only direct edges are learned, as intermediate nodes may have been missed
+            if not agent.map_handler.is_node(departure[0]) or not agent.map_handler.is_node(node): return
+            if node not in [e['node'] for e in agent.map_handler.get_node(departure[0])['node']['edges']]: return
+            length = agent.map_handler.get_edge_length(departure[0], node)
+
+            cls = agent_class(agent)
+            self._blend(self.edge_times, (cls, departure[0], node), duration)
+            if length: self._blend(self.class_speeds, cls, length / duration)
+
+    def remove_agent(self, agent_id):
+        with self.lock:
+            self.departures.pop(agent_id, None)
+
+    def eta(self, cls, from_node, to_node, length):
+        """ Expected time for an agent of the given class to traverse an edge of the given length """
+        key = (cls, from_node, to_node)
+        if key in self.edge_times:
+            return self.edge_times[key][0]
+        speed = self.class_speeds[cls][0] if cls in self.class_speeds else self.default_speed
+        return length / speed if speed else float('inf')
+
+    def route_eta(self, agent, start_node, node):
+        """ Expected time for the agent to follow its route from start_node to node """
+        cls, eta, adding = agent_class(agent), 0.0, False
+        for i in range(min(len(agent.route) - 1, len(agent.route_dists or []))):
+            if agent.route[i] == node: break
+            adding = adding or agent.route[i] == start_node
+            if adding: eta += self.eta(cls, agent.route[i], agent.route[i + 1], agent.route_dists[i])
+        return eta
+
+    def query(self, request=""):
+        """ Format the model for the query service
+
+        :param request: "" for a summary of every class, "<class>" for its edges,
+                        or "<class> <from_node> <to_node>" for a single edge
+        """
+        args = request.split()
+        with self.lock:
+            if not args:
+                return ["%s: %.2fm/s (%i samples)" % (c, s[0], s[1]) for c, s in sorted(self.class_speeds.items())]
+            if len(args) == 1:
+                return ["%s->%s: %.2fs (%i samples)" % (f, t, v[0], v[1])
+                        for (c, f, t), v in sorted(self.edge_times.items()) if c == args[0]]
+            if len(args) == 3:
+                v = self.edge_times.get(tuple(args))
+                return ["%.2fs (%i samples)" % tuple(v)] if v else []
+        return []
+
+    def __repr__(self):
+        return ", ".join(self.query()) or "empty"
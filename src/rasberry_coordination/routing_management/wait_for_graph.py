@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+
+class WaitForGraph(object):
+    def __init__(self):
+        """ Directed graph of which agent is waiting on which
+
+        An edge waiter -> holder exists when the waiter's next fragment begins at a critical
+        point owned by the holder, and the holder will not pass that node within its own
+        current fragment (so it will not be released without intervention).
+        """
+        self.edges = {}  # {waiter: (holder, node)}
+
+    def add_wait(self, waiter, holder, node):
+        if waiter != holder:
+            self.edges[waiter] = (holder, node)
+
+    @classmethod
+    def from_fragments(cls, fragments, owners):
+        """ Construct the graph from unformatted route fragments
+
+        :param fragments: {agent_id: RouteFragments} fragments as produced before formatting
+        :param owners: {node: agent_id} owner of each contested critical point
+        :return: WaitForGraph
+        """
+        graph = cls()
+        for agent_id, frags in fragments.items():
+            if len(frags) < 2: continue
+            blocked = frags[1][0]
+            holder = owners.get(blocked)
+            if holder is None or holder not in fragments: continue
+
+            # If the holder passes the node within its current fragment, the wait is only transient
+            holder_frags = fragments[holder]
+            if holder_frags and blocked in holder_frags[0]: continue
+            graph.add_wait(agent_id, holder, blocked)
+        return graph
+
+    def cycles(self):
+        """ Find each cycle in the graph, as each agent waits on at most one other this is a linear walk
+
+        :return: list of cycles, each as a list of agent_ids in wait order
+        """
+        found, visited = [], set()
+        for start in sorted(self.edges):
+            if start in visited: continue
+            path, index = [], {}
+            node = start
+            while node in self.edges and node not in visited and node not in index:
+                index[node] = len(path)
+                path.append(node)
+                node = self.edges[node][0]
+            if node in index:
+                found.append(path[index[node]:])
+            visited.update(path)
+        return found
+
+    def __repr__(self):
+        return ", ".join(["%s->%s(%s)" % (w, h, n) for w, (h, n) in sorted(self.edges.items())]) or "empty"
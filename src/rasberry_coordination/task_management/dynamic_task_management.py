@@ -8,6 +8,7 @@ from rasberry_coordination.task_management.containers.Task import TaskObj as Tas
 from rasberry_coordination.task_management.modules.base.interfaces.Interface import Interface
 from rasberry_coordination.task_management.__init__ import Stages
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 
 
 class DTM(object):
@@ -93,6 +94,7 @@ class DTM(object):
         self.active_tasks_pub.publish(task_list)
 
     """ Dynamic Task Management """
+    @queued('interrupt', callbacks=lambda self: self.coordinator.agent_manager.cb)
     def InterruptTask(self, m):
         logmsg(category="null")
         logmsg(category="DTM", id="DTM", msg="Interruption made on DTM channels of type: %s" % m.interrupt)
@@ -5,6 +5,7 @@ from rasberry_coordination.task_management.containers.Task import TaskObj as Tas
 from rasberry_coordination.task_management.modules.base.interfaces.Interface import Interface
 from rasberry_coordination.task_management.__init__ import Stages
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 
 
 class SchedulerManager(Interface):
@@ -24,6 +25,7 @@ class SchedulerManager(Interface):
             ast.list.append(sch)
         self.available_schedulers_pub.publish(ast)
 
+    @queued('task')
     def schedule_new_task(self, msg):
         pkg = "rasberry_%s_pkg"%msg.credentials.action
         interface_function = "assign_"+msg.criteria.task_name
@@ -82,6 +82,17 @@ class FindRowEnds(InteractionResponse):
         self.interaction = InteractionDetails(type='info', info='find_row_ends', descriptor=row)
         self.contact = 'row_ends'
 
+class FindVisitOrder(InteractionResponse):
+    """Used to order a set of rows or nodes to cover with the least travel."""
+    def __repr__(self):
+        """Display the targets to order."""
+        return "%s(%s)" % (self.get_class(), self.interaction.list)
+    def __init__(self, agent, targets):
+        """Save the row ids or nodes of interest"""
+        super(FindVisitOrder, self).__init__(agent)
+        self.interaction = InteractionDetails(type='info', info='visit_order', list=targets)
+        self.contact = 'visit_order'
+
 class FindStartNode(InteractionResponse):
     """Used to identify of two nodes, which one is closest ot the agent."""
     def __repr__(self):
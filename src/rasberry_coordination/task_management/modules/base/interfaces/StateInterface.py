@@ -3,6 +3,7 @@ from diagnostic_msgs.msg import KeyValue
 
 from rasberry_coordination.task_management.modules.base.interfaces.Interface import Interface
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 
 class StateInterface(Interface):
     def __init__(self, agent, details, state_publisher, state_subscriber):
@@ -11,6 +12,7 @@ class StateInterface(Interface):
         self.pub = Publisher(state_publisher, KeyValue, queue_size=5)
         self.sub = Subscriber(state_subscriber, KeyValue, self.callback, self.agent.agent_id)
 
+    @queued('state')
     def callback(self, msg, agent_id):
         #recieve new states from remotes
         if msg.key == agent_id:
@@ -18,6 +20,7 @@ class StateInterface(Interface):
             if "_"+state in dir(self):
                 logmsg(category="IDef", id=agent_id, msg="State changed to: %s" % state)
                 getattr(self, "_"+state)()
+                if 'wake' in self.agent.cb: self.agent.cb['wake']('state', agent_id)
 
     def notify(self, state):
         #publish state update to remote
@@ -33,6 +33,7 @@ class navigate2node(stagebase):
 
 class StageBase(object):
     """Base class for all Stages"""
+    polled = False  #True: query every iteration, for stages completed by time or by state changed without a wake callback
     def get_class(self):
         """Cleaned class name for explicit class-type queries"""
         return str(self.__class__)\
@@ -132,6 +133,7 @@ class EnableDebugLocalisation(StageBase):
         self.flag(True)
 class WaitForLocalisation(StageBase):
     """Called to suspend task progression till a location for the agent is recieved"""
+    polled = True  #closest_node updates do not wake the coordinator
     def _start(self):
         """Enable location monitoring"""
         super(WaitForLocalisation, self)._start()
@@ -172,6 +174,7 @@ class Idle(StageBase):
 
 """ Trigger Events """
 class Timeout(StageBase):
+    polled = True
     def __repr__(self):
         if self.agent:
             remaining_time = 0
@@ -193,6 +196,7 @@ class Timeout(StageBase):
         self.flag(any(success_conditions))
 
 class FlagCheck(StageBase):
+    polled = True
     def __init__(self, agent, flag_name=None, default=None, success=None, **kw):
         super(FlagCheck, self).__init__(agent, **kw)
         self.flag_name = flag_name
@@ -228,6 +232,7 @@ class TimeoutFlagCheck(Timeout, FlagCheck):
 """ Communications """
 class NotifyTrigger(StageBase):
     """Used to send a message to trigger some response"""
+    polled = True
     def __init__(self, agent, trigger, msg, colour):
         """Save initialisation details for message"""
         super(NotifyTrigger, self).__init__(agent)
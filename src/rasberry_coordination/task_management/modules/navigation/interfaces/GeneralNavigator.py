@@ -1,5 +1,6 @@
 from rasberry_coordination.task_management.containers.Task import TaskObj as Task
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.command_queue import queued
 
 from rasberry_coordination.task_management.modules.base.interfaces.Interface import Interface
 from rasberry_coordination.task_management.__init__ import Stages
@@ -63,6 +64,7 @@ class GeneralNavigator(Interface):
             logmsg(category="occupy", msg="   :   | %s: %s"%(typ, str(nodes)))
         return nodes_to_filter
 
+    @queued('task')
     def wait_at_node_cb(self, msg):
         logmsg(category="Task", id=self.agent.agent_id, msg="Request to Move Idle to (%s)"%msg.data)
 
@@ -95,6 +97,7 @@ class GeneralNavigator(Interface):
 
 
 
+    @queued('task')
     def exit_at_node_cb(self, msg):
         logmsg(category="Task", id=self.agent.agent_id, msg="Request to exit coordinator")
         node_id = msg.data or self.agent.goal or self.agent.location(accurate=True)
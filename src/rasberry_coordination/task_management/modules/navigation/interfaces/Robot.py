@@ -79,6 +79,11 @@ class Robot(GeneralNavigator):
         """
         edges = []
         for i in range(len(msg.nodes)-1):
+            edge = self.agent.map_handler.get_edge_id(msg.nodes[i], msg.nodes[i+1])
+            if edge:
+                edges.append(edge)
+                continue
+            # nodes are not directly connected, so search for the path between them
             _, _edges = self.get_path(msg.nodes[i], msg.nodes[i+1])
             for edge in _edges:
                 edges.append(edge)
@@ -191,6 +196,7 @@ class Robot(GeneralNavigator):
         self.execpolicy_result = result
         self.execpolicy_goal = ExecutePolicyModeGoal()
         self.publish_route()
+        if 'wake' in self.agent.cb: self.agent.cb['wake']('navigation', self.agent.agent_id)
 
     def cancel_execpolicy_goal(self, ):
         """
@@ -232,5 +238,4 @@ class Robot(GeneralNavigator):
                     break
 
         self.route_publisher.publish(route)
-        rospy.sleep(0.1)
 
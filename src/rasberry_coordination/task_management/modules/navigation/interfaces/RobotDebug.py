@@ -238,7 +238,7 @@ subgoal()
         self.tf_broadcaster.sendTransform(pos, ori, tim, link, "map")
     def publish_edge_tf(self, edge):
         #logmsg(category='vr_roc', id=self.agent.agent_id, msg='   :   | a) Pub Edge TF')
-        n1, n2 = edge.split('_')
+        n1, n2 = self.agent.map_handler.get_edge_nodes(edge) or edge.split('_')  # edge not indexed, or map not yet loaded
         pos1, ori = self.agent.map_handler.get_node_tf(n1)
         pos2, _   = self.agent.map_handler.get_node_tf(n2)
         pos = tuple([a+b/2 for a, b in zip(pos1,pos2)])
@@ -255,7 +255,7 @@ subgoal()
         self.pose_publisher.publish(pose)
     def publish_edge_pose(self, edge):
         #logmsg(category='vr_roc', id=self.agent.agent_id, msg='   :   | b) Pub Edge Pose')
-        n1, n2 = edge.split('_')
+        n1, n2 = self.agent.map_handler.get_edge_nodes(edge) or edge.split('_')  # edge not indexed, or map not yet loaded
         pos1, ori = self.agent.map_handler.get_node_tf(n1)
         pos2, _   = self.agent.map_handler.get_node_tf(n2)
         pos = [(a+b)/2 for a, b in zip(pos1,pos2)]
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+from collections import deque, OrderedDict
+from time import time as Now
+
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+
+
+def percentile(values, p, default=float('nan')):
+    """ Nearest-rank percentile (0-100) of a list of values, default if there are none """
+    if not values: return default
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+class RollingHistogram(object):
+    buckets = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]  # upper bounds (s)
+
+    def __init__(self, window=500):
+        """ The last window samples of a value """
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentile(self, p):
+        return percentile(self.samples, p, 0.0)
+
+    def mean(self):
+        return sum(self.samples) / float(len(self.samples)) if self.samples else 0.0
+
+    def counts(self):
+        """ [(upper bound, samples), ...] with samples above the last bucket counted against inf """
+        counts = OrderedDict([(b, 0) for b in self.buckets + [float('inf')]])
+        for s in self.samples:
+            counts[next(b for b in counts if s <= b)] += 1
+        return list(counts.items())
+
+
+class TickMetrics(object):
+    def __init__(self, window=500, overrun=0.2, publish_period=5.0):
+        """ Durations of each phase of the coordinator loop, and the number of agents each phase acted on
+
+        The loop calls begin() at the start of each iteration, then lap(phase, count) at the end of each
+        phase, the time since the previous lap is recorded against the phase. end() records the work
+        done by the iteration (excluding the wait which follows), the time since the previous iteration
+        began, and counts an overrun if the work took longer than overrun.
+
+        :param window: number of iterations kept in each rolling histogram
+        :param overrun: duration (in seconds) of an iteration's work considered an overrun
+        :param publish_period: time (in seconds) between publishing diagnostics, 0 disables publishing
+        """
+        self.lock = threading.Lock()  # histograms are read by the query service
+        self.window = window
+        self.overrun = overrun
+        self.publish_period = publish_period
+
+        self.phases = OrderedDict()  # {phase: RollingHistogram of seconds} in loop order
+        self.counts = {}  # {phase: RollingHistogram of agents}
+        self.work = RollingHistogram(window)  # time spent in each iteration
+        self.period = RollingHistogram(window)  # time between the start of consecutive iterations
+        self.overruns = deque(maxlen=window)  # 1 for each iteration which overran
+        self.series = OrderedDict()  # {name: RollingHistogram of seconds} other durations recorded by the loop
+        self.ticks = 0
+
+        self.tick_start = None
+        self.lap_start = None
+        self.last_publish = Now()
+
+    def begin(self):
+        now = Now()
+        if self.tick_start is not None:
+            with self.lock: self.period.add(now - self.tick_start)
+        self.tick_start = self.lap_start = now
+
+    def lap(self, phase, count=None):
+        """ Record the time since the last lap against the phase, and optionally the number of agents it acted on """
+        now = Now()
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = RollingHistogram(self.window)
+                self.counts[phase] = RollingHistogram(self.window)
+            self.phases[phase].add(now - self.lap_start)
+            if count is not None: self.counts[phase].add(count)
+        self.lap_start = now
+
+    def record(self, name, value):
+        """ Record a duration which is not a phase (eg. the time a command waited for the loop) """
+        with self.lock:
+            if name not in self.series:
+                self.series[name] = RollingHistogram(self.window)
+            self.series[name].add(value)
+
+    def end(self):
+        """ Record the work done by this iteration
+        :return: True if the iteration overran
+        """
+        work = Now() - self.tick_start
+        with self.lock:
+            self.work.add(work)
+            self.overruns.append(1 if work > self.overrun else 0)
+            self.ticks += 1
+        return work > self.overrun
+
+    def publish_due(self):
+        """ Should diagnostics be published now, the period is restarted if so """
+        if not self.publish_period or Now() - self.last_publish < self.publish_period: return False
+        self.last_publish = Now()
+        return True
+
+    def diagnostics(self):
+        """ DiagnosticArray with a status for the loop, and one for each phase """
+        def values(h): return [KeyValue(key=k, value="%.4f" % v) for k, v in
+                               [('p50', h.percentile(50)), ('p90', h.percentile(90)), ('p99', h.percentile(99)), ('max', h.percentile(100))]]
+
+        array = DiagnosticArray()
+        with self.lock:
+            status = DiagnosticStatus(name='coordinator/tick', hardware_id='rasberry_coordinator')
+            status.level = DiagnosticStatus.WARN if any(self.overruns) else DiagnosticStatus.OK
+            status.message = "%i of the last %i iterations overran %.3fs" % (sum(self.overruns), len(self.overruns), self.overrun)
+            status.values = [KeyValue(key='ticks', value=str(self.ticks))] + \
+                            [KeyValue(key='work_'+kv.key, value=kv.value) for kv in values(self.work)] + \
+                            [KeyValue(key='period_'+kv.key, value=kv.value) for kv in values(self.period)]
+            array.status.append(status)
+
+            for phase, h in self.phases.items():
+                status = DiagnosticStatus(name='coordinator/phase/%s' % phase, hardware_id='rasberry_coordinator')
+                status.level = DiagnosticStatus.WARN if h.percentile(90) > self.overrun else DiagnosticStatus.OK
+                status.message = "p90 %.1fms" % (h.percentile(90) * 1000.0)
+                status.values = values(h)
+                if self.counts[phase].samples:
+                    status.values += [KeyValue(key='agents_mean', value="%.2f" % self.counts[phase].mean()),
+                                      KeyValue(key='agents_max', value=str(self.counts[phase].percentile(100)))]
+                array.status.append(status)
+
+            for name, h in self.series.items():
+                status = DiagnosticStatus(name='coordinator/%s' % name, hardware_id='rasberry_coordinator')
+                status.level = DiagnosticStatus.OK
+                status.message = "p90 %.1fms" % (h.percentile(90) * 1000.0)
+                status.values = values(h)
+                array.status.append(status)
+        return array
+
+    def query(self, request=""):
+        """ Format the metrics for the query service
+
+        :param request: "" for a summary of every phase, or "<phase>" (or "work", "period", or a recorded series) for its histogram
+        """
+        args = request.split()
+        with self.lock:
+            if not args:
+                lines = ["%-14s %8s %8s %8s %8s %7s" % ('phase', 'p50(ms)', 'p90(ms)', 'p99(ms)', 'max(ms)', 'agents')]
+                for phase, h in list(self.phases.items()) + list(self.series.items()) + [('work', self.work), ('period', self.period)]:
+                    agents = "%.1f" % self.counts[phase].mean() if phase in self.counts and self.counts[phase].samples else "-"
+                    lines.append("%-14s %8.2f %8.2f %8.2f %8.2f %7s" % (phase, h.percentile(50) * 1000.0, h.percentile(90) * 1000.0,
+                                                                      h.percentile(99) * 1000.0, h.percentile(100) * 1000.0, agents))
+                lines.append("%i iterations, %i of the last %i overran %.3fs" % (self.ticks, sum(self.overruns), len(self.overruns), self.overrun))
+                return lines
+            h = {'work': self.work, 'period': self.period}.get(args[0], self.phases.get(args[0], self.series.get(args[0])))
+            if h: return ["%-9s %i" % ("<=%gms" % (b * 1000.0) if b != float('inf') else ">%gms" % (h.buckets[-1] * 1000.0), c)
+                          for b, c in h.counts()]
+        return []
+
+    def __repr__(self):
+        return "\n".join(self.query())
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import threading
+from time import time as Now
+
+
+class TickScheduler(object):
+    def __init__(self, min_period=0.02, max_period=0.2, backoff=2.0, sweep_period=None):
+        """ Wait between iterations of the coordinator loop, waking early when a callback signals activity
+
+        Callbacks which change the state evaluated by the loop (location, interrupts, maps, new agents)
+        call wake() so the next iteration starts immediately. Without a wake, the wait grows by backoff
+        after each iteration where nothing happened, up to max_period, so stages which only progress
+        with time (timeouts, navigation feedback, interface flags) are still re-evaluated at least
+        every max_period.
+
+        Callbacks also name the agent they changed, so each iteration need only query the stages of
+        agents marked dirty since the last one (along with stages which are polled). Every sweep_period
+        all agents are queried, to catch changes made without a callback.
+
+        :param min_period: wait after an iteration which made progress
+        :param max_period: longest wait while idle, the previous fixed period was 0.2 seconds
+        :param backoff: factor the wait grows by after each idle iteration
+        :param sweep_period: time (in seconds) between iterations which query every agent, max_period if not given
+        """
+        self.min_period = min_period
+        self.max_period = max(max_period, min_period)
+        self.backoff = backoff
+        self.period = min_period
+
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.reasons = set()  # wake reasons since the last wait
+        self.dirty = set()  # agent_ids changed since the last iteration took them
+
+        self.sweep_period = self.max_period if sweep_period is None else sweep_period
+        self.last_sweep = Now()
+
+    def wake(self, reason=None, agent_id=None):
+        """ Start the next iteration of the loop without waiting, safe to call from any callback
+
+        :param reason: short description of the activity, returned by wait()
+        :param agent_id: agent whose stage should be queried in the next iteration
+        """
+        with self.lock:
+            if reason: self.reasons.add(reason)
+            if agent_id: self.dirty.add(agent_id)
+        self.event.set()
+
+    def take_dirty(self):
+        """ Set of agent_ids marked dirty since the last call """
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def sweep_due(self):
+        """ Should this iteration query every agent, the sweep is restarted if so """
+        if Now() - self.last_sweep < self.sweep_period: return False
+        self.last_sweep = Now()
+        return True
+
+    def wait(self, active):
+        """ Block until woken, or until the current period has passed
+
+        :param active: did the last iteration make progress (resets the period to min_period)
+        :return: set of reasons given to wake() since the last wait
+        """
+        self.period = self.min_period if active else min(self.period * self.backoff, self.max_period)
+        self.event.wait(self.period)
+        self.event.clear()
+        with self.lock:
+            reasons, self.reasons = self.reasons, set()
+        return reasons
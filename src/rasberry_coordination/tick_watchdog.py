@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import sys
+import threading
+import traceback
+from collections import deque
+from time import time as Now
+
+from rasberry_coordination.coordinator_tools import logmsg
+
+
+class TickWatchdog(object):
+    def __init__(self, deadline=0.5, sample_period=0.05, max_samples=20, defer_after=0.1, max_deferrals=10, max_reports=20, enabled=True):
+        """ Report iterations of the coordinator loop which overrun a deadline, and postpone deferrable work
+
+        A sampling thread takes the stack of the loop thread every sample_period once an iteration has
+        passed its deadline. When the iteration ends, each sample is attributed to the phase it was taken
+        in (from the laps of the iteration) and the agent being processed, and a report is logged and kept.
+
+        Work which can run late (monitoring, DTM publishing) asks defer() whether to postpone itself, which
+        it should once the iteration has run for defer_after. Work is never postponed for more than
+        max_deferrals consecutive iterations.
+
+        :param deadline: duration (in seconds) of an iteration considered an overrun
+        :param sample_period: time (in seconds) between stack samples of an overrunning iteration
+        :param max_samples: stack samples kept for each overrun
+        :param defer_after: duration (in seconds) of an iteration after which deferrable work is postponed
+        :param max_deferrals: consecutive iterations a piece of work may be postponed for
+        :param max_reports: overrun reports kept for the query service
+        :param enabled: False disables the sampling thread, deferral is still available
+        """
+        self.deadline = deadline
+        self.sample_period = sample_period
+        self.max_samples = max_samples
+        self.defer_after = defer_after
+        self.max_deferrals = max_deferrals
+
+        self.lock = threading.Lock()  # samples are taken on the watchdog thread
+        self.thread_id = None  # ident of the loop thread
+        self.tick_start = None  # start of the current iteration, None between iterations
+        self.agent_id = None  # agent being processed by the current phase
+        self.laps = []  # [(phase, end time), ...] for the current iteration
+        self.samples = []  # [(time, agent_id, stack), ...] for the current iteration
+
+        self.deferrals = {}  # {work: consecutive iterations postponed}
+        self.reports = deque(maxlen=max_reports)
+        self.overruns = 0
+
+        self.closed = threading.Event()
+        self.thread = None
+        if enabled:
+            self.thread = threading.Thread(target=self.run, name='tick_watchdog')
+            self.thread.daemon = True
+            self.thread.start()
+
+    """ Called by the coordinator loop """
+    def begin(self):
+        with self.lock:
+            self.thread_id = threading.current_thread().ident
+            self.tick_start = Now()
+            self.agent_id = None
+            self.laps, self.samples = [], []
+
+    def lap(self, phase):
+        """ Mark the end of a phase """
+        self.laps.append((phase, Now()))
+        self.agent_id = None
+
+    def at(self, agent):
+        """ Mark the agent being processed, returns the agent so it can wrap calls inline """
+        self.agent_id = agent.agent_id
+        return agent
+
+    def elapsed(self):
+        return Now() - self.tick_start if self.tick_start else 0.0
+
+    def defer(self, work):
+        """ Should the work be postponed to a later iteration """
+        postponed = self.deferrals.get(work, 0)
+        if self.elapsed() < self.defer_after or postponed >= self.max_deferrals:
+            self.deferrals[work] = 0
+            return False
+        self.deferrals[work] = postponed + 1
+        return True
+
+    def end(self):
+        """ Close the iteration, reporting it if it overran
+        :return: the report, or None if the iteration met its deadline
+        """
+        with self.lock:
+            start, self.tick_start = self.tick_start, None
+            laps, samples = self.laps, self.samples
+        duration = Now() - start
+        if duration <= self.deadline: return None
+
+        # Duration of each phase, and the phase each sample was taken in
+        durations, previous = [], start
+        for phase, t in laps:
+            durations.append((phase, t - previous))
+            previous = t
+        def phase_at(t): return next((phase for phase, end in laps if t <= end), 'unlapped')
+
+        slowest = max(durations, key=lambda d: d[1]) if durations else ('unlapped', duration)
+        report = {'t': round(Now(), 3),
+                  'duration': round(duration, 3),
+                  'phase': slowest[0],
+                  'phase_duration': round(slowest[1], 3),
+                  'phases': [(p, round(d, 3)) for p, d in durations],
+                  'samples': [{'phase': phase_at(t), 'agent': a, 'stack': s} for t, a, s in samples]}
+        agents = [s['agent'] for s in report['samples'] if s['phase'] == slowest[0] and s['agent']]
+        report['agent'] = max(set(agents), key=agents.count) if agents else None
+
+        self.overruns += 1
+        self.reports.append(report)
+        logmsg(level="warn", category="WDOG", msg="Iteration took %.2fs (deadline %.2fs), %s took %.2fs%s" %
+               (duration, self.deadline, slowest[0], slowest[1], " processing %s" % report['agent'] if report['agent'] else ""))
+        return report
+
+    """ Sampling Thread """
+    def run(self):
+        while not self.closed.wait(self.sample_period):
+            self.sample()
+
+    def sample(self):
+        with self.lock:
+            if self.tick_start is None or Now() - self.tick_start < self.deadline: return
+            if len(self.samples) >= self.max_samples: return
+            frame = sys._current_frames().get(self.thread_id)
+            stack = [line.strip() for line in traceback.format_stack(frame)] if frame else []
+            self.samples.append((Now(), self.agent_id, stack))
+
+    def close(self):
+        self.closed.set()
+
+    """ Inspection """
+    def query(self, request=""):
+        """ Format the reports for the query service
+
+        :param request: "" for a summary of each overrun, or "<index>" for the stack samples of one (-1 for the latest)
+        """
+        args = request.split()
+        reports = list(self.reports)
+        if not args:
+            lines = ["%i overruns of %.2fs" % (self.overruns, self.deadline)]
+            lines += ["[%i] t=%s %.2fs, %s %.2fs (%s)" % (i, r['t'], r['duration'], r['phase'], r['phase_duration'], r['agent'])
+                      for i, r in enumerate(reports)]
+            return lines
+        try:
+            report = reports[int(args[0])]
+        except (ValueError, IndexError):
+            return []
+        lines = ["t=%s %.2fs, phases: %s" % (report['t'], report['duration'], ", ".join(["%s %.3fs" % p for p in report['phases']]))]
+        for s in report['samples']:
+            lines.append("%s (%s):" % (s['phase'], s['agent']))
+            lines += ["    %s" % l.replace("\n", " | ") for l in s['stack']]
+        return lines
@@ -0,0 +1,40 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+from topological_navigation.tmap_utils import get_distance_to_node_tmap2 as GetNodeDist
+
+
+class EdgeIndex(object):
+    def __init__(self, tmap):
+        """ Lookup of the edges in a tmap2 in both directions, with their lengths
+
+        :param tmap: tmap2 dictionary
+        """
+        self.edge_ids = {}  # {(from_node, to_node): edge_id}
+        self.edges = {}  # {edge_id: (from_node, to_node, length)}
+
+        nodes = {n['node']['name']: n for n in tmap['nodes']}
+        for name, n in nodes.items():
+            for e in n['node']['edges']:
+                if e['node'] not in nodes: continue
+                self.edge_ids[(name, e['node'])] = e['edge_id']
+                self.edges[e['edge_id']] = (name, e['node'], GetNodeDist(n, nodes[e['node']]))
+
+    def edge_id(self, from_node, to_node):
+        """ Edge connecting two nodes (or None if they are not directly connected) """
+        return self.edge_ids.get((from_node, to_node))
+
+    def nodes(self, edge_id):
+        """ (from_node, to_node) of an edge (or None if the edge is not in the map) """
+        return self.edges[edge_id][:2] if edge_id in self.edges else None
+
+    def length(self, edge_id):
+        return self.edges[edge_id][2] if edge_id in self.edges else None
+
+    def route_edges(self, route_nodes):
+        """ Edges joining each consecutive pair of nodes in a route (None where they are not directly connected) """
+        return [self.edge_ids.get(pair) for pair in zip(route_nodes[:-1], route_nodes[1:])]
@@ -7,6 +7,7 @@ from std_msgs.msg import Bool, String as Str, Empty as Emp
 import strands_executive_msgs.msg
 
 from rasberry_coordination.coordinator_tools import logmsg
+from rasberry_coordination.routing_management.map_registry import map_registry
 from rasberry_coordination.msg import TasksDetails as TasksDetailsList, TaskDetails as SingleTaskDetails, Interruption
 
 import yaml
@@ -41,6 +42,21 @@ class MapObj(object):
         self.filtered_route_search = None
         self.filtered_node_list = None
 
+        # used for edge lookups between node names, edge ids and lengths
+        self.edge_index = None
+
+        # structures derived from the local map, shared by all agents using the same map topic
+        self.shared = None
+
+    @property
+    def row_abstraction(self):
+        """ used for long-range planning over rows and junctions, built on first use """
+        return self.shared.row_abstraction if self.shared else None
+
+    @property
+    def route_alternatives(self):
+        """ used to find a route around occupied nodes without filtering the map, built on first use """
+        return self.shared.route_alternatives if self.shared else None
 
     def enable_map_monitoring(self):
         # callback are enabled in base.StageDef.WaitForMap._start()
@@ -49,15 +65,15 @@ class MapObj(object):
 
     def global_map_cb(self, msg):
         # This is included for each agent as a single global map is needed for an agent to
-        # find their neighbouring nodes. In theory, we currently are loading a global map
-        # for every agent, we could instead have a single central one to reference.
+        # find their neighbouring nodes. The map itself is loaded once and shared by all agents.
         # used for sharing occupancy
         t0 = time()
 
         t1 = time()-t0
-        self.global_map = self.load_raw_tmap(msg.data)
+        shared = map_registry.load('/topological_map_2', msg.data)
+        self.global_map = shared.tmap
         t2 = time()-t0
-        self.global_node_list = [node["node"]["name"] for node in self.global_map['nodes']]
+        self.global_node_list = shared.node_list
         t3 = time()-t0
 
         tim = (round(t2-t1,2), round(t3-t2,2))
@@ -71,15 +87,17 @@ class MapObj(object):
         self.raw_msg = msg.data
         t2 = time()-t0
 
-        # used for planning direct routes
-        self.empty_map = self.load_raw_tmap(self.raw_msg)
+        # used for planning direct routes (shared by all agents using the same map topic)
+        shared = self.shared = map_registry.load(self.topic, self.raw_msg)
+        self.empty_map = shared.tmap
         t3 = time()-t0
-        self.empty_route_search = TopologicalRouteSearch(self.empty_map)
+        self.empty_route_search = shared.route_search
         t4 = time()-t0
-        self.empty_node_list = [node["node"]["name"] for node in self.empty_map['nodes']]
+        self.empty_node_list = shared.node_list
+        self.edge_index = shared.edge_index
         t5 = time()-t0
 
-        # used for planning in cluttered workspace
+        # used for planning in cluttered workspace (blocking is specific to each agent)
         self.filtered_map = deepcopy(self.empty_map)
         #self.filtered_map = self.load_raw_tmap(self.raw_msg)
         t6 = time()-t0
@@ -92,6 +110,7 @@ class MapObj(object):
         # Log timings
         tim = tuple([round(t,2) for t in [t2-t1, t3-t2, t4-t3, t5-t4, t6-t5, t7-t6, t8-t7]])
         logmsg(category="TEST", id=self.agent.agent_id, msg="raw(%s) | empty(%s|%s|%s) | filt(%s|%s|%s)"%tim)
+        if 'wake' in self.agent.cb: self.agent.cb['wake']('map', self.agent.agent_id)
 
     def start_map_reset(self):
         self.filtered_map = deepcopy(self.empty_map)
@@ -134,8 +153,18 @@ class MapObj(object):
 
     def get_edge_length(self, from_node, to_node):
         """ get length of edge """
+        edge_id = self.edge_index.edge_id(from_node, to_node) if self.edge_index else None
+        if edge_id: return self.edge_index.length(edge_id)
         return GetNodeDist(self.get_node(from_node), self.get_node(to_node))
 
+    def get_edge_id(self, from_node, to_node):
+        """ get id of the edge connecting two nodes """
+        return self.edge_index.edge_id(from_node, to_node) if self.edge_index else None
+
+    def get_edge_nodes(self, edge_id):
+        """ get (from_node, to_node) of an edge """
+        return self.edge_index.nodes(edge_id) if self.edge_index else None
+
     def get_edge_distances(self):
         """find edge lengths of route """
         self.agent.route_dists = []
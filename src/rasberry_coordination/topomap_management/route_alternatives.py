@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import heapq
+from collections import OrderedDict
+
+from rasberry_coordination.topomap_management.row_abstraction import AbstractRoute
+
+
+class RouteAlternatives(object):
+    def __init__(self, edge_index, max_cached=2000):
+        """ The k shortest loopless routes between nodes of an unfiltered map (Yen's algorithm)
+
+        Routes are cached for each (start, goal, k), the cache belongs to a single map so is discarded
+        along with the map when a new map is received.
+
+        :param edge_index: EdgeIndex of the map
+        :param max_cached: number of (start, goal, k) entries kept, least recently used are dropped first
+        """
+        self.max_cached = max_cached
+        self.cache = OrderedDict()  # {(start, goal, k): [(cost, [node, ...]), ...]}
+        self.adjacency = {}  # {node: [(next_node, length), ...]}
+        for from_node, to_node, length in edge_index.edges.values():
+            self.adjacency.setdefault(from_node, []).append((to_node, length))
+            self.adjacency.setdefault(to_node, [])
+        self.edge_ids = edge_index.edge_ids
+        self.lengths = {pair: edge_index.edges[e][2] for pair, e in edge_index.edge_ids.items()}
+
+    def shortest(self, start, goal, banned_nodes=(), banned_edges=()):
+        """ Dijkstra search avoiding the banned nodes and (from_node, to_node) edges
+
+        :return: (cost, [node, ...]) including start and goal, or None if the goal is unreachable
+        """
+        if start not in self.adjacency or goal not in self.adjacency: return None
+        queue, parents, done = [(0.0, start)], {start: None}, set()
+        costs = {start: 0.0}
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if node in done: continue
+            if node == goal:
+                path = [node]
+                while parents[path[-1]] is not None: path.append(parents[path[-1]])
+                return cost, path[::-1]
+            done.add(node)
+            for next_node, length in self.adjacency[node]:
+                if next_node in banned_nodes or (node, next_node) in banned_edges: continue
+                if cost + length < costs.get(next_node, float('inf')):
+                    costs[next_node], parents[next_node] = cost + length, node
+                    heapq.heappush(queue, (cost + length, next_node))
+        return None
+
+    def k_shortest(self, start, goal, k):
+        """ Up to k routes from start to goal in order of length, each as (cost, [node, ...]) """
+        key = (start, goal, k)
+        if key in self.cache:
+            self.cache[key] = self.cache.pop(key)  # mark as recently used
+            return self.cache[key]
+
+        found = [self.shortest(start, goal)] if start != goal else []
+        found = [f for f in found if f]
+        candidates = []
+        while found and len(found) < k:
+            last = found[-1][1]
+
+            # deviate from each node of the last route found, keeping the route up to that node
+            for i in range(len(last) - 1):
+                root = last[:i + 1]
+                banned_edges = set([(p[i], p[i + 1]) for c, p in found if p[:i + 1] == root])
+                spur = self.shortest(root[-1], goal, banned_nodes=set(root[:-1]), banned_edges=banned_edges)
+                if not spur: continue
+                path = root[:-1] + spur[1]
+                cost = sum([self.lengths[pair] for pair in zip(path[:-1], path[1:])])
+                if all([path != p for c, p in found + candidates]):
+                    heapq.heappush(candidates, (cost, path))
+
+            if not candidates: break
+            found.append(heapq.heappop(candidates))
+
+        self.cache[key] = found
+        if len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+        return found
+
+    def unblocked_route(self, start, goal, blocked, k, node_cost=None):
+        """ Cheapest of the k routes which avoids the blocked nodes (start and goal may be blocked)
+
+        :param node_cost: optional {node: cost} added when entering a node
+        :return: AbstractRoute, or None if each of the k routes is blocked
+        """
+        blocked = set(blocked or [])
+        clear = [(cost, path) for cost, path in self.k_shortest(start, goal, k) if blocked.isdisjoint(path[1:-1])]
+        if not clear: return None
+        if node_cost:
+            clear = [min(clear, key=lambda c: c[0] + sum([node_cost.get(n, 0.0) for n in c[1][1:]]))]
+        path = clear[0][1]
+        return AbstractRoute(source=path[:-1], edge_id=[self.edge_ids[p] for p in zip(path[:-1], path[1:])])
@@ -0,0 +1,192 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import heapq
+from topological_navigation.tmap_utils import get_distance_to_node_tmap2 as GetNodeDist
+
+
+class AbstractRoute(object):
+    """ Route in the same format as returned by TopologicalRouteSearch2 """
+    def __init__(self, source=None, edge_id=None):
+        self.source = source or []
+        self.edge_id = edge_id or []
+
+
+class Chain(object):
+    """ A run of corridor nodes (eg. a row) between two junctions, traversable from nodes[0] to nodes[-1] """
+    def __init__(self, nodes, edges, lengths):
+        self.nodes = nodes
+        self.edges = edges
+        self.lengths = lengths
+        self.offsets = [0.0]  # cumulative length to each node in the chain
+        for l in lengths: self.offsets.append(self.offsets[-1] + l)
+        self.cost = self.offsets[-1]
+
+
+class RowAbstraction(object):
+    def __init__(self, tmap):
+        """ Two-level representation of a tmap2 for long-range planning
+
+        Polytunnel maps are mostly long rows of nodes with exactly two neighbours, joined by
+        headlands. Each such run is collapsed into a single chain between junctions (row ends,
+        headland junctions and anything else with more or fewer than two neighbours), so a
+        search only expands junctions and the cost of a query is independent of row length.
+        Chains are expanded back into nodes only for the route which is returned.
+
+        :param tmap: tmap2 dictionary (the unfiltered map)
+        """
+        nodes = {n['node']['name']: n for n in tmap['nodes']}
+        self.out_edges = {name: [] for name in nodes}
+        neighbours = {name: set() for name in nodes}
+        for name, n in nodes.items():
+            for e in n['node']['edges']:
+                if e['node'] not in nodes or e['node'] == name: continue
+                self.out_edges[name].append((e['node'], e['edge_id'], GetNodeDist(n, nodes[e['node']])))
+                neighbours[name].add(e['node'])
+                neighbours[e['node']].add(name)
+
+        # Junctions are all nodes which are not a simple pass-through
+        self.junctions = set([n for n, nb in neighbours.items() if len(nb) != 2])
+        self.chains = []
+        self.chains_from = {n: [] for n in nodes}  # {junction: [chain_idx]}
+        self.chains_through = {}  # {corridor_node: [(chain_idx, position)]}
+
+        self._build_chains(sorted(self.junctions))
+
+        # Loops made entirely of corridor nodes have no junction, so promote one node in each
+        uncovered = sorted([n for n in nodes if n not in self.junctions and n not in self.chains_through])
+        while uncovered:
+            self.junctions.add(uncovered[0])
+            self._build_chains([uncovered[0]])
+            uncovered = [n for n in uncovered if n not in self.junctions and n not in self.chains_through]
+
+    def _build_chains(self, sources):
+        for junction in sources:
+            for nxt, edge_id, length in self.out_edges[junction]:
+                path, edges, lengths = [junction, nxt], [edge_id], [length]
+                previous = junction
+                while path[-1] not in self.junctions:
+                    forward = [o for o in self.out_edges[path[-1]] if o[0] != previous]
+                    if not forward: break  # one-way dead end
+                    previous = path[-1]
+                    path.append(forward[0][0]); edges.append(forward[0][1]); lengths.append(forward[0][2])
+                    if path[-1] == junction: break
+                if path[-1] not in self.junctions: continue
+
+                idx = len(self.chains)
+                self.chains.append(Chain(path, edges, lengths))
+                self.chains_from[junction].append(idx)
+                for pos, n in enumerate(path[1:-1], 1):
+                    self.chains_through.setdefault(n, []).append((idx, pos))
+
+    def is_node(self, node):
+        return node in self.out_edges
+
+    def blocked_chains(self, blocked):
+        """ Identify the chains which pass through any of the blocked corridor nodes """
+        out = set()
+        for n in blocked:
+            for idx, _ in self.chains_through.get(n, []):
+                out.add(idx)
+        return out
+
+    def search_route(self, start, goal, blocked=None, node_cost=None):
+        """ Find the cheapest route from start to goal which does not enter any blocked node
+
+        :param start: name of the start node
+        :param goal: name of the goal node
+        :param blocked: set of nodes which may not be entered (start and goal are always allowed)
+        :param node_cost: optional {node: cost} added when entering a node
+        :return: AbstractRoute (empty if no route is available)
+        """
+        if not (self.is_node(start) and self.is_node(goal)) or start == goal:
+            return AbstractRoute()
+
+        blocked = set(blocked or []) - set([start, goal])
+        node_cost = node_cost or {}
+        blocked_chains = self.blocked_chains(blocked)
+
+        # Cost of entering the nodes of a chain between two positions, including congestion
+        chain_penalty = {}
+        for n, c in node_cost.items():
+            for idx, pos in self.chains_through.get(n, []):
+                chain_penalty.setdefault(idx, []).append((pos, c))
+        def segment_cost(idx, a, b):
+            chain = self.chains[idx]
+            cost = chain.offsets[b] - chain.offsets[a]
+            cost += sum([c for pos, c in chain_penalty.get(idx, []) if a < pos <= b])
+            if b == len(chain.nodes) - 1: cost += node_cost.get(chain.nodes[-1], 0.0)
+            return cost
+        def segment_clear(idx, a, b):
+            chain = self.chains[idx]
+            if idx not in blocked_chains: return True
+            return not any([n in blocked for n in chain.nodes[a + 1:b + 1]])
+
+        # Seed the search from the start, which may sit part way along a chain
+        dist, prev, queue, best = {}, {}, [], (float('inf'), None)
+        if start in self.junctions:
+            dist[start] = 0.0
+            queue.append((0.0, start))
+        for idx, pos in self.chains_through.get(start, []):
+            chain = self.chains[idx]
+            for gpos in [p for p, n in enumerate(chain.nodes) if n == goal and p > pos]:
+                if segment_clear(idx, pos, gpos):
+                    best = min(best, (segment_cost(idx, pos, gpos), [(idx, pos, gpos)]))
+            end = chain.nodes[-1]
+            if end in blocked or not segment_clear(idx, pos, len(chain.nodes) - 1): continue
+            cost = segment_cost(idx, pos, len(chain.nodes) - 1)
+            if cost < dist.get(end, float('inf')):
+                dist[end], prev[end] = cost, (None, idx, pos)
+                heapq.heappush(queue, (cost, end))
+
+        # Goals part way along a chain are reached from the chain's first junction
+        goal_entries = {}
+        for idx, pos in self.chains_through.get(goal, []):
+            goal_entries.setdefault(self.chains[idx].nodes[0], []).append((idx, pos))
+
+        # Search the abstract graph of junctions
+        while queue:
+            cost, junction = heapq.heappop(queue)
+            if cost > dist.get(junction, float('inf')) or cost >= best[0]: continue
+            if junction == goal:
+                best = (cost, self._segments(prev, junction))
+                break
+            for idx, pos in goal_entries.get(junction, []):
+                if segment_clear(idx, 0, pos):
+                    total = cost + segment_cost(idx, 0, pos)
+                    if total < best[0]:
+                        best = (total, self._segments(prev, junction) + [(idx, 0, pos)])
+            for idx in self.chains_from[junction]:
+                chain = self.chains[idx]
+                end = chain.nodes[-1]
+                if end in blocked or not segment_clear(idx, 0, len(chain.nodes) - 1): continue
+                total = cost + segment_cost(idx, 0, len(chain.nodes) - 1)
+                if total < dist.get(end, float('inf')):
+                    dist[end], prev[end] = total, (junction, idx, 0)
+                    heapq.heappush(queue, (total, end))
+
+        if best[1] is None: return AbstractRoute()
+        return self._expand(best[1])
+
+    def _segments(self, prev, junction):
+        """ Walk back through the junctions to list the chain segments used """
+        segments = []
+        while junction in prev:
+            parent, idx, pos = prev[junction]
+            segments.insert(0, (idx, pos, len(self.chains[idx].nodes) - 1))
+            if parent is None: break
+            junction = parent
+        return segments
+
+    def _expand(self, segments):
+        """ Refine the chain segments back into the node and edge lists of the full map """
+        source, edge_id = [], []
+        for idx, a, b in segments:
+            chain = self.chains[idx]
+            source += chain.nodes[a:b]
+            edge_id += chain.edges[a:b]
+        return AbstractRoute(source, edge_id)
@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# ----------------------------------
+# @author: jheselden
+# @email: jheselden@lincoln.ac.uk
+# @date:
+# ----------------------------------
+
+import yaml
+
+
+def node_name(row, column):
+    return "r%s-c%s" % (row, column)
+
+
+def row_columns(columns):
+    """ Column ids along a row: headland end (a), row entry (b), numbered columns, row exit (y), headland end (z) """
+    return ['a', 'b'] + [str(c) for c in range(1, columns + 1)] + ['y', 'z']
+
+
+def generate_polytunnel_map(rows=10, columns=20, headlands='both', row_spacing=1.5, column_spacing=1.0, name='synthetic'):
+    """ Generate a tmap2 dictionary for a polytunnel with rows joined by headlands
+
+    Rows are named in the rX-cY style used by the occupancy filters, with rX-ca and rX-cz
+    at either end of each row. Headland nodes of neighbouring rows are linked together.
+
+    :param rows: number of rows in the tunnel
+    :param columns: number of numbered column nodes within each row
+    :param headlands: which row ends are joined by a headland ['a', 'z', 'both']
+    :param row_spacing: distance between rows (x)
+    :param column_spacing: distance between columns (y)
+    :param name: name of the map
+    :return: tmap2 dictionary
+    """
+    headland_ends = {'a': ['a'], 'z': ['z'], 'both': ['a', 'z']}[headlands]
+    columns_list = row_columns(columns)
+    nodes = {}
+
+    def add_node(row, ci):
+        n = node_name(row, columns_list[ci])
+        nodes[n] = {'meta': {'map': name, 'node': n, 'pointset': name},
+                    'node': {'name': n,
+                             'pose': {'position': {'x': row * row_spacing, 'y': ci * column_spacing, 'z': 0.0},
+                                      'orientation': {'x': 0.0, 'y': 0.0, 'z': 0.0, 'w': 1.0}},
+                             'properties': {'xy_goal_tolerance': 0.3, 'yaw_goal_tolerance': 0.1},
+                             'restrictions_planning': 'True',
+                             'restrictions_runtime': 'True',
+                             'verts': [],
+                             'edges': []}}
+
+    def add_edge(n1, n2):
+        for a, b in [(n1, n2), (n2, n1)]:
+            nodes[a]['node']['edges'].append({'edge_id': '%s_%s' % (a, b), 'node': b,
+                                              'action': 'move_base', 'action_type': 'move_base_msgs/MoveBaseGoal',
+                                              'goal': {}, 'config': [], 'fail_policy': 'fail',
+                                              'restrictions_planning': 'True', 'restrictions_runtime': 'True',
+                                              'recovery_behaviours_config': ''})
+
+    # Construct each row as a linear chain of nodes
+    for r in range(1, rows + 1):
+        for ci in range(len(columns_list)):
+            add_node(r, ci)
+            if ci: add_edge(node_name(r, columns_list[ci - 1]), node_name(r, columns_list[ci]))
+
+    # Join the ends of neighbouring rows to form the headlands
+    for end in headland_ends:
+        for r in range(1, rows):
+            add_edge(node_name(r, end), node_name(r + 1, end))
+
+    return {'name': name, 'metric_map': name, 'pointset': name, 'transformation': {},
+            'meta': {'last_updated': ''}, 'nodes': [nodes[n] for n in sorted(nodes)]}
+
+
+def dump_map(tmap):
+    """ Format the map as it is published on /topological_map_2 """
+    return yaml.safe_dump(tmap, default_flow_style=False)